@@ -1,18 +1,70 @@
 # pkg
 
-from adopy.ado import AdoFile
-from adopy.flo import SteadyFloFile, TransientFloFile
-from adopy.teo import TeoFile
+import importlib
+
+# submodules and attributes are imported on first access
+SUBMODULES = (
+    'ado',
+    'aggregate',
+    'cli',
+    'compare',
+    'ensemble',
+    'flo',
+    'formats',
+    'layout',
+    'mesh',
+    'mixins',
+    'raster',
+    'teo',
+    'tro',
+    'writer',
+    'zones',
+    )
+
+ATTRIBUTES = {
+    'AdoFile': 'adopy.ado',
+    'SteadyFloFile': 'adopy.flo',
+    'TransientFloFile': 'adopy.flo',
+    'TeoFile': 'adopy.teo',
+    'TroFile': 'adopy.tro',
+    'diff': 'adopy.compare',
+    'read_ensemble': 'adopy.ensemble',
+    'ZoneIndex': 'adopy.zones',
+    }
+
+
+def __getattr__(name):
+    if name in ATTRIBUTES:
+        value = getattr(importlib.import_module(ATTRIBUTES[name]), name)
+    elif name in SUBMODULES:
+        value = importlib.import_module('adopy.' + name)
+    else:
+        raise AttributeError('module \'adopy\' has no attribute \'{name:}\''.format(
+            name=name,
+            ))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(SUBMODULES) | set(ATTRIBUTES))
 
 
 def open(adofile, mode='r'):
+    from adopy.ado import AdoFile
     return AdoFile(adofile, mode=mode)
 
 def open_grid(teofile, mode='r'):
+    from adopy.teo import TeoFile
     return TeoFile(teofile, mode=mode)
 
+def open_trace(trofile, mode='r'):
+    from adopy.tro import TroFile
+    return TroFile(trofile, mode=mode)
+
 def open_flo(flofile, mode='r', transient=False):
+    from adopy.flo import SteadyFloFile, TransientFloFile
     if transient:
         return TransientFloFile(flofile, mode=mode)
     else:
-        return SteadyFloFile(flofile, mode=mode)
\ No newline at end of file
+        return SteadyFloFile(flofile, mode=mode)
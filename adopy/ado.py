@@ -2,27 +2,31 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
+from adopy.formats import ArrayFormat, get_format
+from adopy.layout import close_map, decode_values, map_file, mapped
+from adopy.layout import read_line, scan_blocks
+from adopy.mixins import CopyMixin
+from adopy.writer import SEPARATOR, BlockFormat, values_dtype, write_region
+
 import numpy as np
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from enum import Enum
 import logging
+import mmap
 import os
-import re
 
 log = logging.getLogger(os.path.basename(__file__))
 
-ARRAYFORMAT = (
-    r'\((?P<ncols>\d+)(?P<atype>[AEI])(?P<width>\d+).?(?P<precision>\d+)?\)'
-    )
-
 
 class BlockType(Enum):
     SCALAR = 1
     ARRAY = 2
 
 
-class AdoBlock(object):
+class AdoBlock(CopyMixin):
     def __init__(self, name, blocktype, values):
         self.name = name
         self.blocktype = blocktype
@@ -49,11 +53,34 @@ class AdoBlock(object):
             'values': self.values,
             }
 
+    def take(self, indices):
+        '''Return copy of block with array values taken at indices'''
+        block = self.copy()
+        if self.blocktype is BlockType.ARRAY:
+            block.values = np.take(self.values, indices)
+        return block
+
+
+def take_blocks(blocks, indices, nvalues=None):
+    '''Take array values at indices from each block, e.g. to apply a node
+    permutation or node mapping while streaming a flo file. If nvalues is
+    given, blocks of another size are passed unchanged.'''
+    for block in blocks:
+        if (nvalues is not None) and (np.size(block.values) != nvalues):
+            yield block
+        else:
+            yield block.take(indices)
+
 
 class AdoFile(object):
     def __init__(self, filepath, mode='r'):
         self.filepath = Path(filepath)
         self.f = self.open(mode=mode)
+        self._layouts = None
+        self._fd = None
+        self._buf = None
+        self._map = None
+        self._pos = 0
 
     @property
     def closed(self):
@@ -65,7 +92,11 @@ class AdoFile(object):
 
     @property
     def lines(self):
-        return (l.rstrip('\n') for l in self.f)
+        '''Generate lines from the read position of the block framer'''
+        line = self._next_line()
+        while line is not None:
+            yield line
+            line = self._next_line()
 
     def __enter__(self):
         return self
@@ -78,151 +109,238 @@ class AdoFile(object):
 
     def close(self):
         self.f.close()
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._unmap()
 
     def reset_file(self):
         self.f.seek(0)
+        self._unmap()
+        self._pos = 0
+
+    def _mapped(self):
+        '''Read-only memory map of the file for sequential reads, mapped
+        again after reset_file'''
+        if self._map is None:
+            self._map = map_file(self.filepath)
+        return self._map
+
+    def _unmap(self):
+        close_map(self._map)
+        self._map = None
+
+    def _next_line(self):
+        '''Next line from the read position, None at end of file'''
+        buf = self._mapped()
+        line, pos = read_line(buf, self._pos)
+        if line is None:
+            # last line without line ending
+            if self._pos >= len(buf):
+                return None
+            line, pos = bytes(buf[self._pos:]).rstrip(b'\r'), len(buf)
+        self._pos = pos
+        return line.decode()
+
+    def _next_layout(self):
+        '''Frame next block from the read position by its byte layout'''
+        layout = next(scan_blocks(self._mapped(), self._pos), None)
+        if layout is None:
+            raise StopIteration
+        self._pos = layout.end
+        return layout
 
-    def read(self, use_loop=False):
+    def read(self, use_loop=False, dtype=None, precision=None):
+        '''Generate blocks, numeric arrays are decoded as dtype or with
+        precision 'single' (float32, int32) or 'double' (float64, int64)'''
         self.reset_file()
-        yield from self.read_blocks(use_loop=use_loop)
+        yield from self.read_blocks(use_loop=use_loop,
+            dtype=dtype, precision=precision)
 
-    def read_blocks(self, use_loop=False):
+    def read_blocks(self, use_loop=False, dtype=None, precision=None):
         if self.mode == 'w':
             raise ValueError('File not readable in write mode')
         while True:
             try:
-                block = self.read_block(use_loop=use_loop)
+                block = self.read_block(use_loop=use_loop,
+                    dtype=dtype, precision=precision)
                 yield block
             except StopIteration:
                 break
 
-    def as_dict(self):
-        return {bl.name: bl for bl in self.read()}
-
-    def read_block(self, use_loop=False):
-        # parse block name
-        name = self._read_name()
-
-        # parse block type
-        blocktype = self._read_blocktype()
+    def as_dict(self, dtype=None, precision=None):
+        return {bl.name: bl for bl in self.read(
+            dtype=dtype, precision=precision)}
+
+    def scan(self):
+        '''Return byte layout of all blocks without decoding values'''
+        with mapped(self.filepath) as buf:
+            return list(scan_blocks(buf))
+
+    def read_selection(self, names=None, dtype=None, precision=None):
+        '''Generate blocks with name in names, located by a layout scan so
+        that other blocks are skipped without decoding'''
+        with mapped(self.filepath) as buf:
+            for layout in scan_blocks(buf):
+                if (names is None) or (self._layout_name(layout) in names):
+                    values = decode_values(buf, layout,
+                        dtype=dtype, precision=precision)
+                    yield self._block_from_layout(layout, values)
 
-        # read values
-        if blocktype is BlockType.SCALAR:
-            values = self._read_scalar()            
-        elif blocktype is BlockType.ARRAY:
-            values = self._read_array(use_loop=use_loop)
-        else:
-            raise ValueError('block type {blocktype:d} not implemented'.format(
-                blocktype=blocktype.value,
-                ))
-
-        # read endset
-        self._read_endset()
-
-        # return Block object
-        return AdoBlock(name=name, blocktype=blocktype, values=values)
+    @property
+    def layouts(self):
+        '''Block layouts, scanned once on first access'''
+        if self._layouts is None:
+            self._layouts = self.scan()
+        return self._layouts
+
+    def open_positional(self):
+        '''
+        Open file for positional reads, which do not depend on the file
+        position of self.f and can be shared between threads. Uses os.pread
+        where available and a read-only memory map otherwise.
+        '''
+        if self._fd is None:
+            self._fd = os.open(self.filepath,
+                os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            if not hasattr(os, 'pread'):
+                self._buf = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        return self
 
-    def _read_name(self):        
-        line = next(self.lines)
-        while line.startswith('---'):
-            line = next(self.lines)
-        if line == 'END FILE GRIDFL':
-            raise StopIteration
-        name = (line
-            .replace('*SET*', '')
-            .replace('*TEXT*', '')
+    def _pread(self, offset, size):
+        if self._buf is not None:
+            return self._buf[offset:offset + size]
+        return os.pread(self._fd, size, offset)
+
+    def read_block_at(self, layout, dtype=None, precision=None):
+        '''Read block at layout using a positional read, thread-safe after
+        open_positional'''
+        self.open_positional()
+        data = self._pread(layout.offset, layout.nbytes)
+        values = decode_values(data, layout,
+            dtype=dtype, precision=precision, base=layout.offset)
+        return self._block_from_layout(layout, values)
+
+    def _layout_name(self, layout):
+        return layout.name
+
+    def _block_from_layout(self, layout, values):
+        return AdoBlock(
+            name=layout.name,
+            blocktype=BlockType(layout.blocktype),
+            values=values,
             )
-        return name
 
-    def _read_blocktype(self):        
-        line = next(self.lines)
-        blocktype = BlockType(int(line))
-        return blocktype
-
-    def _read_scalar(self):
-        line = next(self.lines)        
+    def read_concurrent(self, names=None, workers=4, dtype=None,
+        precision=None):
+        '''
+        Read blocks in a thread pool, each thread decoding a different block
+        with positional reads. Blocks are generated in file order, optionally
+        only blocks with name in names. Number fields are decoded with integer
+        array operations that release the GIL, only fields that do not match
+        the layout of the first field of a chunk (e.g. NaN) are cast with
+        astype while holding it.
+        '''
+        self.open_positional()
+        layouts = [l for l in self.layouts
+            if (names is None) or (self._layout_name(l) in names)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(
+                lambda l: self.read_block_at(l,
+                    dtype=dtype, precision=precision),
+                layouts)
+
+    def read_block(self, use_loop=False, dtype=None, precision=None):
+        '''Read next block. The block is framed in the memory-mapped file
+        and its values are decoded from a slice of the map, with use_loop
+        line by line.'''
+        if self.mode == 'w':
+            raise ValueError('File not readable in write mode')
+        layout = self._next_layout()
+        values = decode_values(self._mapped(), layout,
+            dtype=dtype, precision=precision, use_loop=use_loop)
+        return AdoBlock(
+            name=layout.name,
+            blocktype=BlockType(layout.blocktype),
+            values=values,
+            )
 
-        # try to cast as int, then float, otherwise as string array
+    def update_block(self, name, values, **blockformat):
+        '''
+        Replace values of block name in a file opened in r+ mode. The block
+        is formatted with the array format of the existing block if values
+        are of the same kind, with the default format otherwise, unless
+        blockformat is given. Raises ValueError before the file is touched if
+        values do not fit the format. If the formatted block has the same
+        byte size, it is written in place. Otherwise the file is rewritten,
+        copying all other blocks as raw bytes. Transient blocks are selected
+        by their full name, e.g. 'PHI1,TIME:  1005.0000'.
+        '''
+        if self.mode != 'r+':
+            raise ValueError('File not updatable in mode \'{mode:}\''.format(
+                mode=self.mode,
+                ))
+        layout = self._find_layout(name)
+        block = AdoBlock(layout.name, BlockType(layout.blocktype), values)
+        if (layout.arrayformat is not None) and not blockformat:
+            fmt = get_format(layout.arrayformat)
+            if fmt.kind == ArrayFormat.for_dtype(values_dtype(values)).kind:
+                blockformat = {
+                    'ncols': fmt.ncols,
+                    'width': fmt.width,
+                    'precision': fmt.digits or 6,
+                    }
+
+        # formatted block without leading separator and with the line
+        # endings of the file, raises ValueError before the file is touched
+        # if values overflow the format
+        newline = '\r\n' if layout.newline == 2 else '\n'
+        data = BlockFormat(newline=newline, **blockformat).format(block,
+            separator=False)
+
+        self.f.flush()
+        if len(data) == layout.nbytes:
+            with open(self.filepath, 'r+b') as f:
+                f.seek(layout.offset)
+                f.write(data)
+            self._layouts = None
+            return
+
+        # stream untouched bytes around block into new file
+        mode = self.mode
+        self.close()
+        tmpfile = self.filepath.with_name(self.filepath.name + '.tmp')
         try:
-            value = np.array(line, dtype=np.int)
-        except ValueError:
-            try:
-                value = np.array(line, dtype=np.float)
-            except:
-                value = np.array(line)
-                
-        return value
-
-    def _read_array(self, use_loop=False):
-        # read array header
-        line = next(self.lines)
-        nvalues, arrayformat = line.split()
-        nvalues = int(nvalues)
-
-        # parse number format        
-        m = re.search(ARRAYFORMAT, arrayformat)
-        if m is None:
-            raise ValueError('error reading array format')
-        ncols = int(m.group('ncols'))
-        width = int(m.group('width'))
-        atype = m.group('atype')
-        if atype == 'E':
-            dtype = np.float
-        elif atype == 'I':
-            dtype = np.int
-        elif atype == 'A':
-            dtype = np.str
-        else:
-            raise ValueError('data type \'{atype:}\' not implemented'.format(
-                atype=atype,
+            with mapped(self.filepath) as buf, open(tmpfile, 'wb') as dst:
+                with memoryview(buf) as view:
+                    dst.write(view[:layout.offset])
+                    dst.write(data)
+                    dst.write(view[layout.end:])
+            os.replace(tmpfile, self.filepath)
+        except BaseException:
+            if tmpfile.exists():
+                tmpfile.unlink()
+            raise
+        finally:
+            self.f = self.open(mode=mode)
+            self._layouts = None
+            self._pos = 0
+
+    def _find_layout(self, name):
+        layouts = [l for l in self.scan()
+            if (l.name == name) or (self._layout_name(l) == name)]
+        if not layouts:
+            raise ValueError('block \'{name:}\' not found'.format(
+                name=name,
                 ))
-
-        # read array values
-        nrows = nvalues // ncols
-        nremainder = nvalues % ncols
-        if use_loop:
-            rows = []
-            for irow in range(nrows + 1):
-                line = next(self.lines)
-                if (irow < nrows) or (nremainder == 0):
-                    count = ncols
-                else:
-                    count = nremainder
-                if count > 0:
-                    row = np.array(
-                        [line[ic * width: (ic + 1) * width]
-                        for ic in range(count)],
-                        dtype=dtype,
-                        )
-                    rows.append(row)
-            values = np.concatenate(rows, axis=0)
-        else:
-            values = []
-            if nrows > 0:
-                delimiter = [width,] * ncols
-                rect_array = np.genfromtxt(self.f,
-                    dtype=dtype,
-                    delimiter=delimiter,
-                    max_rows=nrows,
-                    )
-                values.append(rect_array.flatten())
-            if nremainder > 0:
-                delimiter = [width,] * nremainder
-                remainder = np.genfromtxt(self.f,
-                    dtype=dtype,
-                    delimiter=delimiter,
-                    max_rows=1,
-                    )
-                values.append(remainder.flatten())
-            values = np.concatenate(values, axis=0)
-        return values
-
-    def _read_endset(self):
-        line = next(self.lines)
-        assert (line == 'ENDSET') or (line == 'ENDTEXT'), \
-            'error reading file {f.name:}'.format(
-            f=self.filepath,
-            )
+        if len(layouts) > 1:
+            raise ValueError('block name \'{name:}\' not unique'.format(
+                name=name,
+                ))
+        return layouts[0]
 
     def write(self, blocks=None, records=None, use_loop=False, **blockformat):        
         records = records or []
@@ -234,12 +352,74 @@ class AdoFile(object):
         for block in blocks:
             self.write_block(block, use_loop=use_loop, **blockformat)
 
+    def write_parallel(self, blocks=None, records=None, workers=None,
+        **blockformat):
+        '''
+        Write blocks formatted in parallel worker processes. The byte size of
+        each block follows from its header, number of values and fixed-width
+        format, so blocks are taken one at a time, the file is extended by
+        the size of each block and a worker formats the block in chunks of
+        rows straight into its region of the file. At most twice the number
+        of workers blocks are in flight. If a block fails, e.g. values
+        overflow the format, the blocks not yet written are cancelled and the
+        file is truncated to its size before the call.
+        '''
+        blockformat = BlockFormat(**blockformat)
+        self.f.flush()
+        start = offset = self.f.seek(0, os.SEEK_END)
+        with open(self.filepath, 'r+b') as f:
+            try:
+                if workers == 1:
+                    for block in self._iter_blocks(blocks, records):
+                        size = blockformat.nbytes(block)
+                        f.truncate(offset + size)
+                        write_region(self.filepath, offset, size, block,
+                            blockformat)
+                        offset += size
+                else:
+                    self._write_pool(f, offset, blocks, records, workers,
+                        blockformat)
+            except BaseException:
+                f.truncate(start)
+                raise
+        self.f.seek(0, os.SEEK_END)
+
+    def _write_pool(self, f, offset, blocks, records, workers, blockformat):
+        nworkers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            try:
+                for block in self._iter_blocks(blocks, records):
+                    size = blockformat.nbytes(block)
+                    f.truncate(offset + size)
+                    pending.append(pool.submit(write_region,
+                        self.filepath, offset, size, block, blockformat))
+                    offset += size
+                    if len(pending) >= 2 * nworkers:
+                        pending.popleft().result()
+                while pending:
+                    pending.popleft().result()
+            except BaseException:
+                # running blocks finish before the pool shuts down
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def _iter_blocks(self, blocks=None, records=None):
+        for block in (blocks or []):
+            yield self._to_base(block)
+        for record in (records or []):
+            yield self._to_base(self._block_from_record(record))
+
+    def _block_from_record(self, record):
+        return AdoBlock.from_record(record)
+
+    def _to_base(self, block):
+        return block
+
     def write_block(self, block, ncols=6, width=14, precision=6, use_loop=False):
         # get dtype
-        try:
-            dtype = block.values.dtype
-        except AttributeError:
-            dtype = np.array(block.values).dtype
+        dtype = values_dtype(block.values)
 
         # write separator
         self._write_separator()
@@ -266,36 +446,16 @@ class AdoFile(object):
         self._write_endset(dtype)
 
     def _write_separator(self):
-        self.f.write(72*'-' + '\n')
+        self.f.write(SEPARATOR)
 
     def _write_name(self, name, dtype):
-        if dtype.type is np.str_:
-            prefix = 'TEXT'
-        else:
-            prefix = 'SET'
-        self.f.write('*{prefix:}*{name:}'.format(
-            prefix=prefix,
-            name=name.upper(),
-                ) + '\n'
-            )
+        self.f.write(BlockFormat().name_line(name, dtype))
 
     def _write_blocktype(self, blocktype):
-        self.f.write('{blocktype:d}'.format(
-            blocktype=blocktype.value,
-                ) + '\n'
-            )
+        self.f.write(BlockFormat().blocktype_line(blocktype))
 
     def _write_scalar(self, value, dtype):
-        if dtype == np.float:
-            valuetext = '{value:9.6f}'.format(value=value)
-        elif dtype == np.int:
-            valuetext = '{value:d}'.format(value=value)
-        else:
-            valuetext = '{value:}'.format(value=value)
-        self.f.write('{valuetext:}'.format(
-            valuetext=valuetext,
-                ) + '\n'
-            )
+        self.f.write(BlockFormat().scalar_line(value, dtype))
 
     def _write_array(self, values, dtype,
         ncols, width, precision=6,
@@ -303,46 +463,15 @@ class AdoFile(object):
         ):        
         # write array header
         nvalues = values.size
-        if dtype == np.float:
-            formattext = '({ncols:d}E{width:d}.{precision:d})'.format(
-                ncols=ncols,
-                width=width,
-                precision=precision,
-                )
-        elif dtype == np.int:
-            formattext = '({ncols:d}I{width:d})'.format(
-                ncols=ncols,
-                width=width,
-                )
-        else:
-            formattext = '({ncols:d}A{width:d})'.format(
-                ncols=ncols,
-                width=width,
-                )
-        self.f.write('{nvalues:<10d}{formattext:}'.format(
-            nvalues=nvalues,
-            formattext=formattext,
-                ) + '\n'
-            )
+        self._write_arrayheader(nvalues, dtype, ncols, width, precision)
 
         # write array values
         values = np.ravel(values)
-        nrows = nvalues // ncols
-        nremainder = nvalues % ncols
+        blockformat = BlockFormat(ncols, width, precision)
         if use_loop:
-            if dtype == np.float:
-                fmt = '{{:+{width:d}.{precision:d}E}}'.format(
-                    width=width,
-                    precision=precision,
-                    )
-            elif dtype == np.int:
-                fmt = '{{:{width:d}d}}'.format(
-                    width=width,
-                    )
-            else:
-                fmt = '{{:<{width:d}}}'.format(
-                    width=width,
-                    )
+            fmt = blockformat.array_format(dtype)
+            nrows = nvalues // ncols
+            nremainder = nvalues % ncols
             for irow in range(nrows + 1):
                 if (irow < nrows) or (nremainder == 0):
                     count = ncols
@@ -350,42 +479,15 @@ class AdoFile(object):
                     count = nremainder
                 if count > 0:
                     row = values[irow*ncols:irow*ncols + count]
-                    line = (fmt*count).format(*row)
+                    line = (fmt.pyformat()*count).format(*row)
                     self.f.write(line + '\n')
         else:
-            if dtype == np.float:
-                fmt = '%+{width:d}.{precision:d}E'.format(
-                    width=width,
-                    precision=precision,
-                    )
-            elif dtype == np.int:
-                fmt = '%{width:d}d'.format(
-                    width=width,
-                    )
-            else:
-                fmt = '%{width:d}s'.format(
-                    width=width,
-                    )
-            if nrows > 0:
-                rect_array = values[:nrows*ncols].reshape((nrows, ncols))
-                np.savetxt(self.f, rect_array,
-                    delimiter='',
-                    fmt=fmt,
-                    )
-            remainder = values[nrows*ncols:].reshape((1, nremainder))
-            np.savetxt(self.f, remainder,
-                delimiter='',
-                fmt=fmt,
-                )         
-
+            for text in blockformat.rows(values, dtype):
+                self.f.write(text)
 
+    def _write_arrayheader(self, nvalues, dtype, ncols, width, precision=6):
+        self.f.write(BlockFormat(ncols, width, precision).arrayheader_line(
+            nvalues, dtype))
 
     def _write_endset(self, dtype):
-        if dtype.type is np.str_:
-            suffix = 'TEXT'
-        else:
-            suffix = 'SET'
-        self.f.write('END{suffix:}'.format(
-            suffix=suffix,
-                ) + '\n'
-            )
+        self.f.write(BlockFormat().endset_line(dtype))
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import numpy as np
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class P2Quantile(object):
+    '''
+    Streaming estimate of a quantile for every node using the P-square
+    algorithm of Jain and Chlamtac (1985), with five markers per node. The
+    first five values are kept and give the exact quantile.
+    '''
+    def __init__(self, q, nvalues):
+        self.q = q
+        self.count = 0
+        self.heights = np.empty((5, nvalues))
+        self.positions = np.tile(np.arange(1., 6.)[:, np.newaxis],
+            (1, nvalues))
+        self.desired = np.array([1., 1. + 2. * q, 1. + 4. * q, 3. + 2. * q, 5.])
+        self.increments = np.array([0., q / 2., q, (1. + q) / 2., 1.])
+
+    def update(self, values):
+        if self.count < 5:
+            self.heights[self.count] = values
+            self.count += 1
+            if self.count == 5:
+                self.heights.sort(axis=0)
+            return
+        self.count += 1
+        heights, positions = self.heights, self.positions
+
+        # update extreme markers and find cell k of each value
+        heights[0] = np.minimum(heights[0], values)
+        heights[4] = np.maximum(heights[4], values)
+        k = np.clip(np.sum(values >= heights[1:4], axis=0), 0, 3)
+        positions += (np.arange(5)[:, np.newaxis] > k)
+        self.desired += self.increments
+
+        # adjust inner markers
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            up = (d >= 1.) & (positions[i + 1] - positions[i] > 1.)
+            down = (d <= -1.) & (positions[i - 1] - positions[i] < -1.)
+            move = up | down
+            if not move.any():
+                continue
+            d = np.where(up, 1., -1.)
+            parabolic = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                (positions[i] - positions[i - 1] + d) *
+                (heights[i + 1] - heights[i]) /
+                (positions[i + 1] - positions[i]) +
+                (positions[i + 1] - positions[i] - d) *
+                (heights[i] - heights[i - 1]) /
+                (positions[i] - positions[i - 1])
+                )
+            neighbour = np.where(up, i + 1, i - 1)
+            columns = np.arange(heights.shape[1])
+            linear = heights[i] + d * (
+                (heights[neighbour, columns] - heights[i]) /
+                (positions[neighbour, columns] - positions[i])
+                )
+            is_between = (heights[i - 1] < parabolic) & (
+                parabolic < heights[i + 1])
+            adjusted = np.where(is_between, parabolic, linear)
+            heights[i] = np.where(move, adjusted, heights[i])
+            positions[i] = np.where(move, positions[i] + d, positions[i])
+
+    def result(self):
+        if self.count == 0:
+            return np.full(self.heights.shape[1], np.nan)
+        if self.count < 5:
+            return np.percentile(self.heights[:self.count], self.q * 100.,
+                axis=0)
+        return self.heights[2].copy()
+
+
+class TemporalAggregator(object):
+    '''
+    One-pass aggregation of transient blocks of a single parameter into time
+    bins. Statistics are 'mean', 'sum', 'min', 'max', 'count' and percentiles
+    as 'p<percentile>', e.g. 'p10'. Bins are given by their edges, bin i holds
+    times in [edges[i], edges[i + 1]). Blocks are expected in time order,
+    percentile estimators of a bin are released once a later bin is reached.
+    '''
+    def __init__(self, bins, statistics):
+        self.edges = np.asarray(bins, dtype=np.float64)
+        self.nbins = len(self.edges) - 1
+        self.statistics = list(statistics)
+        self.percentiles = {}
+        for statistic in self.statistics:
+            if statistic.startswith('p'):
+                self.percentiles[statistic] = float(statistic[1:]) / 100.
+            elif statistic not in ('mean', 'sum', 'min', 'max', 'count'):
+                raise ValueError('statistic \'{statistic:}\' not implemented'.format(
+                    statistic=statistic,
+                    ))
+        self.counts = np.zeros(self.nbins, dtype=np.int64)
+        self.sums = None
+        self.mins = None
+        self.maxs = None
+        self.quantiles = {}
+        self.open_bin = None
+        self.results = {}
+
+    def _allocate(self, nvalues):
+        self.sums = np.zeros((self.nbins, nvalues))
+        self.mins = np.full((self.nbins, nvalues), np.inf)
+        self.maxs = np.full((self.nbins, nvalues), -np.inf)
+        for statistic in self.percentiles:
+            self.results[statistic] = np.full((self.nbins, nvalues), np.nan)
+
+    def update(self, time, values):
+        ibin = np.searchsorted(self.edges, time, side='right') - 1
+        if (ibin < 0) or (ibin >= self.nbins):
+            return
+        if self.sums is None:
+            self._allocate(np.size(values))
+
+        # finish percentiles of previous bin
+        if ibin != self.open_bin:
+            if (self.open_bin is not None) and (ibin < self.open_bin):
+                raise ValueError('blocks not in time order at {time:}'.format(
+                    time=time,
+                    ))
+            self._close_bin()
+            self.open_bin = ibin
+            self.quantiles = {
+                statistic: P2Quantile(q, np.size(values))
+                for statistic, q in self.percentiles.items()
+                }
+
+        self.counts[ibin] += 1
+        self.sums[ibin] += values
+        np.minimum(self.mins[ibin], values, out=self.mins[ibin])
+        np.maximum(self.maxs[ibin], values, out=self.maxs[ibin])
+        for quantile in self.quantiles.values():
+            quantile.update(values)
+
+    def _close_bin(self):
+        for statistic, quantile in self.quantiles.items():
+            self.results[statistic][self.open_bin] = quantile.result()
+        self.quantiles = {}
+
+    def result(self):
+        '''Dictionary of (nbins, nvalues) arrays per statistic, nan for
+        empty bins'''
+        self._close_bin()
+        if self.sums is None:
+            return {}
+        empty = self.counts == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts[:, np.newaxis]
+        results = {
+            'mean': means,
+            'sum': self.sums,
+            'min': self.mins,
+            'max': self.maxs,
+            'count': np.repeat(self.counts[:, np.newaxis],
+                self.sums.shape[1], axis=1),
+            }
+        results.update(self.results)
+        output = {}
+        for statistic in self.statistics:
+            values = results[statistic].astype(np.float64)
+            values[empty] = np.nan
+            output[statistic] = values
+        return output
+
+
+def aggregate_blocks(blocks, reducers, bins):
+    '''
+    Aggregate a stream of transient blocks in one pass. Reducers maps
+    parameter name to a list of statistics, see TemporalAggregator. Returns a
+    dictionary per parameter of (nbins, nvalues) arrays per statistic.
+    '''
+    aggregators = {
+        name: TemporalAggregator(bins, statistics)
+        for name, statistics in reducers.items()
+        }
+    for block in blocks:
+        if block.name in aggregators:
+            aggregators[block.name].update(block.time, block.values)
+    return {name: agg.result() for name, agg in aggregators.items()}
@@ -0,0 +1,281 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.ado import AdoBlock, AdoFile, BlockType
+from adopy.flo import parse_name
+from adopy.layout import ARRAY, decode_values, mapped, scan_blocks
+from adopy.writer import SEPARATOR
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from pathlib import Path
+import argparse
+import logging
+import zipfile
+import sys
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='adopy',
+        description='Inspect, extract and convert ado, flo and teo files',
+        )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_selection(subparser):
+        subparser.add_argument('--names', nargs='+', metavar='NAME',
+            help='select blocks by parameter name')
+        subparser.add_argument('--tmin', type=float,
+            help='select transient blocks from time')
+        subparser.add_argument('--tmax', type=float,
+            help='select transient blocks up to and including time')
+
+    def add_workers(subparser):
+        subparser.add_argument('--workers', type=int, default=1,
+            help='number of worker processes for decoding blocks')
+
+    info = subparsers.add_parser('info',
+        help='list blocks without decoding values')
+    info.add_argument('file')
+    add_selection(info)
+
+    stats = subparsers.add_parser('stats',
+        help='print statistics per block')
+    stats.add_argument('file')
+    add_selection(stats)
+    add_workers(stats)
+
+    extract = subparsers.add_parser('extract',
+        help='write selected blocks and nodes to ado file')
+    extract.add_argument('file')
+    extract.add_argument('output')
+    add_selection(extract)
+    extract.add_argument('--nodes', nargs='+', type=int, metavar='NODE',
+        help='select node numbers (one-based)')
+    add_workers(extract)
+
+    convert = subparsers.add_parser('convert',
+        help='convert between ado text and npz binary, or split flo file')
+    convert.add_argument('file')
+    convert.add_argument('output')
+    convert.add_argument('--split', action='store_true',
+        help='split into one ado file per parameter in output directory')
+    add_selection(convert)
+    add_workers(convert)
+
+    cat = subparsers.add_parser('cat',
+        help='concatenate blocks of ado files to stdout')
+    cat.add_argument('files', nargs='+')
+    cat.add_argument('-o', '--output',
+        help='output file instead of stdout')
+    add_selection(cat)
+
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if (args.command == 'convert') and not _convertible(args):
+        parser.error('convert expects an .npz file or --split')
+    commands = {
+        'info': info,
+        'stats': stats,
+        'extract': extract,
+        'convert': convert,
+        'cat': cat,
+        }
+    return commands[args.command](args)
+
+
+def select(layouts, names=None, tmin=None, tmax=None):
+    for layout in layouts:
+        name, time = parse_name(layout.name)
+        if (names is not None) and (name not in names):
+            continue
+        if (time is not None) and (tmin is not None) and (time < tmin):
+            continue
+        if (time is not None) and (tmax is not None) and (time > tmax):
+            continue
+        yield layout
+
+
+def imap(func, filepath, layouts, workers=1):
+    '''Apply func(filepath, layout) to each layout, in order, using a bounded
+    number of blocks in flight'''
+    if workers == 1:
+        with mapped(filepath) as buf:
+            for layout in layouts:
+                yield layout, func(buf, layout)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for layout in layouts:
+            pending.append((layout, pool.submit(_apply, func, filepath, layout)))
+            if len(pending) >= 2 * workers:
+                layout, future = pending.popleft()
+                yield layout, future.result()
+        while pending:
+            layout, future = pending.popleft()
+            yield layout, future.result()
+
+
+def _apply(func, filepath, layout):
+    with mapped(filepath) as buf:
+        return func(buf, layout)
+
+
+def _stats(buf, layout):
+    values = decode_values(buf, layout)
+    if values.dtype.kind not in 'if' or values.size == 0:
+        return None
+    return values.min(), values.max(), values.mean(), values.std()
+
+
+def _layouts(args, filepath=None):
+    with mapped(filepath or args.file) as buf:
+        layouts = list(scan_blocks(buf))
+    return list(select(layouts, args.names, args.tmin, args.tmax))
+
+
+def _block(layout, values):
+    if layout.blocktype == ARRAY:
+        return AdoBlock(layout.name, BlockType.ARRAY, values)
+    else:
+        return AdoBlock(layout.name, BlockType.SCALAR, values.item())
+
+
+def info(args):
+    for layout in _layouts(args):
+        print('{name:<40} {blocktype:<6} {nvalues:>10d} {fmt:<12} {offset:>12d}'.format(
+            name=layout.name,
+            blocktype=BlockType(layout.blocktype).name,
+            nvalues=layout.nvalues,
+            fmt=layout.arrayformat or '',
+            offset=layout.offset,
+            ))
+
+
+def stats(args):
+    print('{:<40} {:>10} {:>14} {:>14} {:>14} {:>14}'.format(
+        'name', 'nvalues', 'min', 'max', 'mean', 'std',
+        ))
+    layouts = _layouts(args)
+    for layout, result in imap(_stats, args.file, layouts, args.workers):
+        if result is None:
+            continue
+        print('{name:<40} {nvalues:>10d} {:>14.6E} {:>14.6E} {:>14.6E} {:>14.6E}'.format(
+            *result,
+            name=layout.name,
+            nvalues=layout.nvalues,
+            ))
+
+
+def extract(args):
+    layouts = _layouts(args)
+    if args.nodes is not None:
+        indices = np.array(args.nodes) - 1
+    with AdoFile(args.output, 'w') as dst:
+        for layout, values in imap(decode_values, args.file, layouts,
+                args.workers):
+            block = _block(layout, values)
+            if args.nodes is not None:
+                block = block.take(indices)
+            dst.write_block(block)
+
+
+def _convertible(args):
+    return args.split or any(Path(f).suffix.lower() == '.npz'
+        for f in (args.file, args.output))
+
+
+def convert(args):
+    if args.split:
+        return _split(args)
+    if Path(args.file).suffix.lower() == '.npz':
+        return _from_npz(args)
+    if Path(args.output).suffix.lower() == '.npz':
+        return _to_npz(args)
+    raise ValueError('convert expects an .npz file or --split')
+
+
+def _to_npz(args):
+    layouts = _layouts(args)
+    with zipfile.ZipFile(args.output, 'w', allowZip64=True) as zf:
+        for layout, values in imap(decode_values, args.file, layouts,
+                args.workers):
+            with zf.open(layout.name + '.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, values, allow_pickle=False)
+
+
+def _from_npz(args):
+    with np.load(args.file) as src, AdoFile(args.output, 'w') as dst:
+        for name in src.files:
+            values = src[name]
+            if values.ndim == 0:
+                block = AdoBlock(name, BlockType.SCALAR, values.item())
+            else:
+                block = AdoBlock(name, BlockType.ARRAY, values.ravel())
+            dst.write_block(block)
+
+
+def _split(args):
+    outdir = Path(args.output)
+    outdir.mkdir(parents=True, exist_ok=True)
+    layouts = _layouts(args)
+    files = {}
+    try:
+        for layout, values in imap(decode_values, args.file, layouts,
+                args.workers):
+            name, time = parse_name(layout.name)
+            if name not in files:
+                files[name] = AdoFile(outdir / (name + '.ado'), 'w')
+            files[name].write_block(_block(layout, values))
+    finally:
+        for dst in files.values():
+            dst.close()
+
+
+def cat(args):
+    if args.output is None:
+        dst = sys.stdout.buffer
+    else:
+        dst = open(args.output, 'wb')
+    separator = SEPARATOR.encode()
+    try:
+        for ifile, filepath in enumerate(args.files):
+            layouts = _layouts(args, filepath)
+            with mapped(filepath) as buf:
+                if ifile == 0:
+                    # file header of first file, e.g. of a steady flo file
+                    dst.write(_header(buf))
+                for layout in layouts:
+                    # copy block bytes without decoding
+                    dst.write(separator)
+                    dst.write(buf[layout.offset:layout.end])
+        dst.flush()
+    finally:
+        if args.output is not None:
+            dst.close()
+
+
+
+def _header(buf):
+    '''Bytes before the separator line of the first block'''
+    first = next(scan_blocks(buf), None)
+    if first is None:
+        return b''
+    start = buf.rfind(b'\n', 0, max(first.offset - 1, 0)) + 1
+    if buf[start:first.offset].rstrip(b'\r\n') == SEPARATOR.encode().rstrip():
+        return buf[:start]
+    return buf[:first.offset]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.flo import parse_name
+from adopy.layout import SCALAR, decode_range, decode_values, mapped, scan_blocks
+
+import numpy as np
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class BlockDiff(object):
+    '''
+    Difference of a pair of blocks with equal name and time. Status is 'ok'
+    when all values are within tolerance, 'differ' otherwise, 'shape' when
+    the number of values differs and 'missing' when the block is in one file
+    only.
+    '''
+    __slots__ = ('name', 'time', 'status', 'nvalues', 'nfail',
+        'max_abs', 'mean_abs', 'rms', 'first_nodes')
+
+    def __init__(self, name, time, status, nvalues=0, nfail=0,
+        max_abs=np.nan, mean_abs=np.nan, rms=np.nan, first_nodes=None,
+        ):
+        self.name = name
+        self.time = time
+        self.status = status
+        self.nvalues = nvalues
+        self.nfail = nfail
+        self.max_abs = max_abs
+        self.mean_abs = mean_abs
+        self.rms = rms
+        self.first_nodes = first_nodes if first_nodes is not None else []
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'name={s.name:}, '
+            'time={s.time:}, '
+            'status={s.status:}, '
+            'nfail={s.nfail:d}, '
+            'max_abs={s.max_abs:g}'
+            ')').format(s=self)
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+
+def diff(a, b, rtol=1e-5, atol=1e-8, chunksize=65536, fail_fast=False,
+    maxnodes=10, equal_nan=True,
+    ):
+    '''
+    Compare two ado or flo files block by block. Blocks are paired by name,
+    and by time for transient files, and compared in chunks of chunksize
+    values so that neither file is loaded as a whole. Values of a differ
+    when |a - b| > atol + rtol * |b|, or when only one of them is NaN. NaN
+    in both files is a difference unless equal_nan. Returns list of
+    BlockDiff in order of file a, followed by blocks found in b only. With
+    fail_fast the comparison stops at the first block that is not ok. Node
+    numbers in first_nodes are zero-based, at most maxnodes per block.
+    Difference statistics are over the values that are not NaN in either
+    file.
+    '''
+    with mapped(a) as buf_a, mapped(b) as buf_b:
+        layouts_b = {}
+        for layout in scan_blocks(buf_b):
+            layouts_b.setdefault(parse_name(layout.name), layout)
+
+        results = []
+        for layout_a in scan_blocks(buf_a):
+            key = parse_name(layout_a.name)
+            layout_b = layouts_b.pop(key, None)
+            if layout_b is None:
+                result = BlockDiff(*key, status='missing')
+            else:
+                result = _diff_block(buf_a, buf_b, layout_a, layout_b,
+                    rtol, atol, chunksize, maxnodes, equal_nan)
+            results.append(result)
+            if fail_fast and not result.ok:
+                return results
+
+        for key in layouts_b:
+            results.append(BlockDiff(*key, status='missing'))
+            if fail_fast:
+                break
+    return results
+
+
+def _chunks(buf, layout, chunksize):
+    '''Generate values of block in chunks of chunksize values'''
+    if layout.blocktype == SCALAR:
+        yield decode_values(buf, layout).reshape(1)
+        return
+    if not layout.fixed:
+        # rows of varying length, decode block once
+        values = decode_values(buf, layout)
+        for start in range(0, layout.nvalues, chunksize):
+            yield values[start:start + chunksize]
+        return
+    for start in range(0, layout.nvalues, chunksize):
+        yield decode_range(buf, layout, start, start + chunksize)
+
+
+def _diff_block(buf_a, buf_b, layout_a, layout_b, rtol, atol, chunksize,
+    maxnodes, equal_nan,
+    ):
+    name, time = parse_name(layout_a.name)
+    if (layout_a.nvalues != layout_b.nvalues) or (
+        layout_a.blocktype != layout_b.blocktype):
+        return BlockDiff(name, time, status='shape',
+            nvalues=layout_a.nvalues)
+
+    nfail = 0
+    ncompared = 0
+    max_abs = 0.
+    sum_abs = 0.
+    sum_squares = 0.
+    first_nodes = []
+    start = 0
+    chunks = zip(
+        _chunks(buf_a, layout_a, chunksize),
+        _chunks(buf_b, layout_b, chunksize),
+        )
+    for values_a, values_b in chunks:
+        if (values_a.dtype.kind in 'US') or (values_b.dtype.kind in 'US'):
+            failed = values_a.astype(np.str_) != values_b.astype(np.str_)
+        else:
+            values_a = values_a.astype(np.float64)
+            values_b = values_b.astype(np.float64)
+            with np.errstate(invalid='ignore'):
+                abs_diff = np.abs(values_a - values_b)
+                failed = ~(abs_diff <= atol + rtol * np.abs(values_b))
+
+            # equal infinities and, with equal_nan, NaN in both files
+            failed &= values_a != values_b
+            if equal_nan:
+                failed &= ~(np.isnan(values_a) & np.isnan(values_b))
+
+            compared = abs_diff[~np.isnan(abs_diff)]
+            if compared.size > 0:
+                max_abs = max(max_abs, compared.max())
+            ncompared += compared.size
+            sum_abs += compared.sum()
+            sum_squares += np.square(compared).sum()
+        if failed.any():
+            nfail += int(failed.sum())
+            if len(first_nodes) < maxnodes:
+                nodes = start + np.flatnonzero(failed)[:maxnodes]
+                first_nodes.extend(nodes[:maxnodes - len(first_nodes)].tolist())
+        start += len(values_a)
+
+    if ncompared > 0:
+        mean_abs = sum_abs / ncompared
+        rms = np.sqrt(sum_squares / ncompared)
+    else:
+        mean_abs = rms = 0.
+    return BlockDiff(name, time,
+        status='differ' if nfail > 0 else 'ok',
+        nvalues=layout_a.nvalues,
+        nfail=nfail,
+        max_abs=max_abs,
+        mean_abs=mean_abs,
+        rms=rms,
+        first_nodes=first_nodes,
+        )
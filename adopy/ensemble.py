@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.flo import clean_name, split_time
+from adopy.layout import ARRAY, decode_values, mapped, read_line, scan_blocks
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def read_ensemble(paths, names=None, transient=False, workers=None):
+    '''
+    Read blocks from an ensemble of flo files sharing grid and block layout.
+    Returns dictionary of (nmembers, nvalues) arrays keyed by block name as in
+    SteadyFloFile.as_dict, or by (name, time) for transient files. The block
+    layout is scanned from the first file only and reused to decode the other
+    members in a process pool of size workers. Members of another size or
+    with other block names at these offsets are scanned themselves.
+    '''
+    paths = [Path(p) for p in paths]
+    if not paths:
+        raise ValueError('no ensemble members')
+
+    # scan layout of first member
+    with mapped(paths[0]) as buf:
+        layouts = list(scan_blocks(buf))
+    keys, layouts = _select(layouts, names, transient)
+    size = paths[0].stat().st_size
+
+    # decode first member in process to allocate stacks
+    first = _read_member(paths[0], layouts, size, keys, transient)
+    stacks = {}
+    for key, values in zip(keys, first):
+        stacks[key] = np.empty((len(paths),) + values.shape, dtype=values.dtype)
+        stacks[key][0] = values
+
+    # decode other members reusing layout
+    args = (paths[1:], repeat(layouts), repeat(size), repeat(keys),
+        repeat(transient))
+    if workers == 1:
+        members = map(_read_member, *args)
+        _fill(stacks, keys, members)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            members = pool.map(_read_member, *args)
+            _fill(stacks, keys, members)
+    return stacks
+
+
+def _key(layout, transient):
+    if transient:
+        return split_time(layout.name)
+    else:
+        return clean_name(layout.name)
+
+
+def _select(layouts, names, transient):
+    keys, selected = [], []
+    for layout in layouts:
+        if layout.blocktype != ARRAY:
+            continue
+        key = _key(layout, transient)
+        name = key[0] if transient else key
+        if (names is None) or (name in names):
+            keys.append(key)
+            selected.append(layout)
+    return keys, selected
+
+
+def _fill(stacks, keys, members):
+    for imember, values in enumerate(members, start=1):
+        for key, member_values in zip(keys, values):
+            stacks[key][imember] = member_values
+
+
+def _read_member(path, layouts, size, keys, transient):
+    with mapped(path) as buf:
+        if (len(buf) != size) or not _same_names(buf, layouts):
+            # layout differs from first member, scan this file
+            log.warning('layout of {path:} differs, scanning file'.format(
+                path=path,
+                ))
+            member_layouts = {_key(l, transient): l for l in scan_blocks(buf)}
+            missing = [key for key in keys if key not in member_layouts]
+            if missing:
+                raise ValueError('block {key:} not found in {path:}'.format(
+                    key=missing[0],
+                    path=path,
+                    ))
+            layouts = [member_layouts[key] for key in keys]
+        return [decode_values(buf, layout) for layout in layouts]
+
+
+def _same_names(buf, layouts):
+    '''Test if the name line at each layout offset holds the layout name'''
+    for layout in layouts:
+        line, pos = read_line(buf, layout.offset)
+        if (line is None) or (line.decode(errors='replace').replace(
+                '*SET*', '').replace('*TEXT*', '') != layout.name):
+            return False
+    return True
@@ -2,38 +2,87 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from adopy.ado import AdoBlock, AdoFile
+from adopy.aggregate import aggregate_blocks
+from adopy.ado import AdoBlock, AdoFile, BlockType
+from adopy.formats import get_format
+from adopy.layout import ARRAY, decode_values, mapped, scan_blocks
+from adopy.layout import get_dtype
+from adopy.writer import SEPARATOR
+
+import numpy as np
 
 import logging
 import os
+import time
 
 log = logging.getLogger(os.path.basename(__file__))
 
 
+def clean_name(name):
+    '''Strip steady-state suffix from block name'''
+    return (name
+        .replace(', STEADY-STATE==', '')
+        .strip()
+        )
+
+
+def split_time(name):
+    '''Split transient block name into parameter name and time'''
+    name, timestr = name.split(',')
+    time = float(timestr.replace('TIME:', ''))
+    return name, time
+
+
+def parse_name(name):
+    '''Return parameter name and time (None for steady-state) of block'''
+    if ',TIME:' in name:
+        return split_time(name)
+    else:
+        return clean_name(name), None
+
+
 class SteadyFloFile(AdoFile):
-    def read(self, clean_names=True, use_loop=False):
+    def read(self, clean_names=True, use_loop=False, dtype=None,
+        precision=None):
         self.reset_file()
         self._skip_header()
-        blocks = super().read_blocks(use_loop=False)        
+        blocks = super().read_blocks(use_loop=use_loop,
+            dtype=dtype, precision=precision)
         for block in blocks:
             if clean_names:
-                block.name = (block.name
-                    .replace(', STEADY-STATE==', '')
-                    .strip()
-                    )
+                block.name = clean_name(block.name)
             yield block
 
-    def as_dict(self, clean_names=True):
-        return {bl.name: bl for bl in self.read(clean_names=clean_names)}
+    def as_dict(self, clean_names=True, dtype=None, precision=None):
+        return {bl.name: bl for bl in self.read(clean_names=clean_names,
+            dtype=dtype, precision=precision)}
+
+    def _layout_name(self, layout):
+        return clean_name(layout.name)
+
+    def _block_from_layout(self, layout, values):
+        return AdoBlock(
+            name=clean_name(layout.name),
+            blocktype=BlockType(layout.blocktype),
+            values=values,
+            )
 
     def _skip_header(self, header=5):
         for i in range(header):
-            line = next(self.lines)
+            self._next_line()
 
     def write(self, blocks=None, records=None, use_loop=False, **blockformat):
         self._write_header()
         super().write(blocks, records, use_loop=use_loop, **blockformat)
 
+    def write_parallel(self, blocks=None, records=None, workers=None,
+        **blockformat):
+        # header as bytes, like the blocks written in worker processes
+        self.f.flush()
+        with open(self.filepath, 'ab') as f:
+            f.write(5 * SEPARATOR.encode())
+        super().write_parallel(blocks, records, workers=workers, **blockformat)
+
     def _write_header(self, header=5):
         for i in range(header):
             self._write_separator()
@@ -76,23 +125,165 @@ class TransientAdoBlock(AdoBlock):
             time=self.time,
             )
         return AdoBlock(
-            name=name,
+            name=block_name,
             blocktype=self.blocktype,
             values=self.values,
             )
 
 
+class TransientBlockView(object):
+    '''Single time step of a TransientBlockStack, values is a view'''
+    __slots__ = ('name', 'time', 'values')
+
+    blocktype = BlockType.ARRAY
+
+    def __init__(self, name, time, values):
+        self.name = name
+        self.time = time
+        self.values = values
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'name={s.name:}, '
+            'time={s.time:}'
+            ')').format(s=self)
+
+
+class TransientBlockStack(object):
+    '''All time steps of one parameter as times array of shape (ntimes,) and
+    one contiguous values array of shape (ntimes, nvalues)'''
+    __slots__ = ('name', 'times', 'values')
+
+    def __init__(self, name, times, values):
+        self.name = name
+        self.times = times
+        self.values = values
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'name={s.name:}, '
+            'shape={s.values.shape:}'
+            ')').format(s=self)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for itime in range(len(self.times)):
+            yield self[itime]
+
+    def __getitem__(self, index):
+        if np.ndim(index) == 0 and not isinstance(index, slice):
+            return TransientBlockView(self.name, self.times[index],
+                self.values[index])
+        return self.__class__(self.name, self.times[index],
+            self.values[index])
+
+    def sel(self, tmin=None, tmax=None, nodes=None):
+        '''Select time steps in [tmin, tmax] and optionally nodes'''
+        start = 0 if tmin is None else np.searchsorted(self.times, tmin,
+            side='left')
+        stop = len(self.times) if tmax is None else np.searchsorted(
+            self.times, tmax, side='right')
+        values = self.values[start:stop]
+        if nodes is not None:
+            values = values[:, nodes]
+        return self.__class__(self.name, self.times[start:stop], values)
+
+    def to_blocks(self):
+        for view in self:
+            yield TransientAdoBlock(view.name, view.time, BlockType.ARRAY,
+                view.values)
+
+
 class TransientFloFile(AdoFile):
-    def read_block(self, use_loop=False):
-        block = super().read_block(use_loop=use_loop)
+    def read_block(self, use_loop=False, dtype=None, precision=None):
+        block = super().read_block(use_loop=use_loop,
+            dtype=dtype, precision=precision)
 
         # extract time from block name
-        block.name, timestr = block.name.split(',')
-        time = float(timestr.replace('TIME: ', ''))
+        block.name, time = split_time(block.name)
 
         # return transient ado block
         return TransientAdoBlock.from_block(block, time)
 
+    def read_stacks(self, names=None, dtype=None, precision=None):
+        '''
+        Read transient array blocks as a TransientBlockStack per parameter,
+        optionally only parameters in names. Values are decoded straight into
+        the preallocated stacks, without intermediate block objects.
+        '''
+        with mapped(self.filepath) as buf:
+            layouts = {}
+            for layout in scan_blocks(buf):
+                if layout.blocktype != ARRAY:
+                    continue
+                name, blocktime = split_time(layout.name)
+                if (names is None) or (name in names):
+                    layouts.setdefault(name, []).append((blocktime, layout))
+
+            stacks = {}
+            for name, timed_layouts in layouts.items():
+                timed_layouts.sort(key=lambda tl: tl[0])
+                first = timed_layouts[0][1]
+                stack_dtype = get_dtype(get_format(first.arrayformat).dtype,
+                    dtype=dtype, precision=precision,
+                    )
+                times = np.array([t for t, l in timed_layouts])
+                values = np.empty((len(timed_layouts), first.nvalues),
+                    dtype=stack_dtype)
+                for row, (blocktime, layout) in zip(values, timed_layouts):
+                    decode_values(buf, layout, out=row)
+                stacks[name] = TransientBlockStack(name, times, values)
+        return stacks
+
+    def aggregate(self, reducers, bins, dtype=None, precision=None):
+        '''
+        Aggregate blocks into time bins in one pass with constant memory per
+        bin. Reducers maps parameter name to statistics ('mean', 'sum', 'min',
+        'max', 'count' or percentiles like 'p10'), bins are the time bin
+        edges. Returns per parameter a dictionary of (nbins, nnodes) arrays
+        per statistic.
+        '''
+        blocks = self.read_selection(names=list(reducers),
+            dtype=dtype, precision=precision)
+        return aggregate_blocks(blocks, reducers, bins)
+
+    def follow(self, poll_interval=1., timeout=None):
+        '''
+        Generate blocks from a transient flo file that is still being written.
+        The file is polled every poll_interval seconds and only blocks
+        appended after the last complete block are parsed; a partially
+        written block is picked up once it is complete. Stops after timeout
+        seconds without new blocks, or never if timeout is None.
+        '''
+        offset = 0
+        last_change = time.monotonic()
+        while True:
+            if os.stat(self.filepath).st_size > offset:
+                with mapped(self.filepath) as buf:
+                    for layout in scan_blocks(buf, offset):
+                        offset = layout.end
+                        last_change = time.monotonic()
+                        yield self._block_from_layout(layout,
+                            decode_values(buf, layout))
+            if (timeout is not None) and (
+                    time.monotonic() - last_change > timeout):
+                return
+            time.sleep(poll_interval)
+
+    def _layout_name(self, layout):
+        return split_time(layout.name)[0]
+
+    def _block_from_layout(self, layout, values):
+        name, blocktime = split_time(layout.name)
+        return TransientAdoBlock(
+            name=name,
+            time=blocktime,
+            blocktype=BlockType(layout.blocktype),
+            values=values,
+            )
+
     def write(self, blocks=None, records=None, use_loop=False, **blockformat):
         records = records or []
         blocks = blocks or []
@@ -102,3 +293,9 @@ class TransientFloFile(AdoFile):
 
         for block in blocks:
             self.write_block(block.to_base(), use_loop=use_loop, **blockformat)
+
+    def _block_from_record(self, record):
+        return TransientAdoBlock.from_record(record)
+
+    def _to_base(self, block):
+        return block.to_base()
@@ -0,0 +1,361 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import numpy as np
+
+import logging
+import os
+import re
+
+log = logging.getLogger(os.path.basename(__file__))
+
+ARRAYFORMAT = re.compile(
+    r'\(\s*(?:(?P<scale>[+-]?\d+)P\s*,?\s*)?'
+    r'(?P<ncols>\d*)(?P<descriptor>ES|EN|[AEFDGI])(?P<width>\d+)'
+    r'(?:\.(?P<digits>\d+))?(?:E\d+)?\s*\)',
+    re.IGNORECASE,
+    )
+
+# decoded dtype per edit descriptor
+DESCRIPTORS = {
+    'A': np.str_,
+    'D': np.float64,
+    'E': np.float64,
+    'EN': np.float64,
+    'ES': np.float64,
+    'F': np.float64,
+    'G': np.float64,
+    'I': np.int64,
+    }
+
+# compiled formats by format string
+_FORMATS = {}
+
+# fields converted per chunk
+CHUNKSIZE = 65536
+
+# exact powers of ten and largest exact mantissa of float64
+MAXPOWER = 22
+POW10 = 10. ** np.arange(MAXPOWER + 1)
+MAXMANTISSA = 2 ** 53
+
+# most digits of an int64 mantissa
+MAXDIGITS = 18
+
+
+class FieldPlan(object):
+    '''
+    Column positions of a number field, taken from the first field of a
+    chunk: leading columns with blanks, sign and integer digits, the
+    decimal point, fraction digits and an exponent with marker (E or D),
+    sign and digits. Fields are parsed column by column into an integer
+    mantissa and a decimal exponent, fields that do not follow the plan are
+    flagged.
+    '''
+    __slots__ = ('dot', 'marker', 'lead', 'fraction', 'exponent')
+
+    def __init__(self, dot, marker, lead, fraction, exponent):
+        self.dot = dot
+        self.marker = marker
+        self.lead = lead
+        self.fraction = fraction
+        self.exponent = exponent
+
+    @property
+    def has_exponent(self):
+        return self.marker is not None
+
+    @classmethod
+    def from_field(cls, field):
+        width = len(field)
+        upper = field.upper()
+        marker = max(upper.find(b'E'), upper.find(b'D'))
+        end = marker if marker >= 0 else width
+        dot = field.find(b'.', 0, end)
+        lead = range(0, dot if dot >= 0 else end)
+        fraction = range(dot + 1, end) if dot >= 0 else range(0)
+        exponent = range(marker + 1, width) if marker >= 0 else range(0)
+        if (len(fraction) > MAXDIGITS) or (marker >= 0 and not (
+                2 <= len(exponent) <= 5)):
+            return None
+        return cls(
+            dot=dot if dot >= 0 else None,
+            marker=marker if marker >= 0 else None,
+            lead=lead,
+            fraction=fraction,
+            exponent=exponent,
+            )
+
+    def parse(self, raw):
+        '''Parse fields raw of shape (nfields, width) as uint8, returns
+        (mantissa, exponent, negative, ok)'''
+        nfields = len(raw)
+        ok = np.ones(nfields, dtype=bool)
+        mantissa = np.zeros(nfields, dtype=np.int64)
+        ndigits = np.zeros(nfields, dtype=np.int64)
+        negative = np.zeros(nfields, dtype=bool)
+        started = np.zeros(nfields, dtype=bool)
+
+        # blanks, optional sign, then digits
+        for column in self.lead:
+            char = raw[:, column]
+            digit = char - ord('0')
+            is_digit = digit <= 9
+            is_blank = char == ord(' ')
+            is_sign = (char == ord('+')) | (char == ord('-'))
+            ok &= is_digit | ((is_blank | is_sign) & ~started)
+            negative |= char == ord('-')
+            started |= ~is_blank
+            ndigits += is_digit
+            mantissa *= 10
+            mantissa += np.where(is_digit, digit, 0)
+
+        if self.dot is not None:
+            ok &= raw[:, self.dot] == ord('.')
+        for column in self.fraction:
+            digit = raw[:, column] - ord('0')
+            ok &= digit <= 9
+            mantissa *= 10
+            mantissa += digit
+        ndigits += len(self.fraction)
+        ok &= (ndigits >= 1) & (ndigits <= MAXDIGITS)
+
+        exponent = np.zeros(nfields, dtype=np.int64)
+        if self.marker is not None:
+            marker = raw[:, self.marker] | 32
+            ok &= (marker == ord('e')) | (marker == ord('d'))
+            sign = raw[:, self.exponent[0]]
+            ok &= (sign == ord('+')) | (sign == ord('-'))
+            for column in self.exponent[1:]:
+                digit = raw[:, column] - ord('0')
+                ok &= digit <= 9
+                exponent *= 10
+                exponent += digit
+            exponent = np.where(sign == ord('-'), -exponent, exponent)
+        exponent -= len(self.fraction)
+        return mantissa, exponent, negative, ok
+
+
+class ArrayFormat(object):
+    '''
+    Compiled Fortran array format, e.g. (6E14.6). Holds the number of values
+    per row, the field width, the decoded dtype and the fixed-width field
+    dtype used to slice rows, and decodes and encodes array values. Use
+    get_format to compile each distinct format string only once.
+    '''
+    def __init__(self, text, ncols, descriptor, width, digits=None, scale=0):
+        self.text = text
+        self.ncols = ncols
+        self.descriptor = descriptor
+        self.width = width
+        self.digits = digits
+        self.scale = scale
+        self.dtype = DESCRIPTORS[descriptor]
+        self.field_dtype = np.dtype('S{width:d}'.format(width=width))
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            '{s.text:}'
+            ')').format(s=self)
+
+    @classmethod
+    def parse(cls, text):
+        m = ARRAYFORMAT.search(text)
+        if m is None:
+            raise ValueError('array format \'{text:}\' not implemented'.format(
+                text=text,
+                ))
+        digits = m.group('digits')
+        return cls(
+            text=text,
+            ncols=int(m.group('ncols') or 1),
+            descriptor=m.group('descriptor').upper(),
+            width=int(m.group('width')),
+            digits=int(digits) if digits is not None else None,
+            scale=int(m.group('scale') or 0),
+            )
+
+    @classmethod
+    def for_dtype(cls, dtype, ncols=6, width=14, precision=6):
+        '''Format for writing values of dtype'''
+        kind = np.dtype(dtype).kind
+        if kind == 'f':
+            text = '({ncols:d}E{width:d}.{precision:d})'
+        elif kind in 'iu':
+            text = '({ncols:d}I{width:d})'
+        else:
+            text = '({ncols:d}A{width:d})'
+        return get_format(text.format(
+            ncols=ncols,
+            width=width,
+            precision=precision,
+            ))
+
+    @property
+    def kind(self):
+        return np.dtype(self.dtype).kind
+
+    def rowsize(self, newline=1):
+        return self.ncols * self.width + newline
+
+    def nbytes(self, nvalues, newline=1):
+        '''Byte size of nvalues in fixed-width rows'''
+        nrows, nremainder = divmod(nvalues, self.ncols)
+        size = nrows * self.rowsize(newline)
+        if nremainder > 0:
+            size += nremainder * self.width + newline
+        return size
+
+    def fields(self, data, nvalues, newline=1, fixed=True):
+        '''Field arrays of data as (nrows, ncols) and (nremainder,) views of
+        fixed-width rows, or from split lines if not fixed'''
+        if not fixed:
+            return [self._line_fields(data, nvalues)]
+        nrows, nremainder = divmod(nvalues, self.ncols)
+        rowsize = self.rowsize(newline)
+        parts = [np.ndarray((nrows, self.ncols),
+            dtype=self.field_dtype,
+            buffer=data,
+            strides=(rowsize, self.width),
+            )]
+        if nremainder > 0:
+            parts.append(np.ndarray((nremainder,),
+                dtype=self.field_dtype,
+                buffer=data,
+                offset=nrows * rowsize,
+                ))
+        return parts
+
+    def _line_fields(self, data, nvalues):
+        width = self.width
+        fields = [
+            line[ic * width:(ic + 1) * width]
+            for line in bytes(data).splitlines()
+            for ic in range(self.ncols)
+            ]
+        return np.array(fields[:nvalues], dtype=self.field_dtype)
+
+    def decode(self, data, nvalues, newline=1, fixed=True, dtype=None,
+        out=None):
+        '''Decode nvalues from data, into out if given'''
+        parts = self.fields(data, nvalues, newline=newline, fixed=fixed)
+        try:
+            if self.kind == 'U':
+                values = np.char.strip(np.concatenate(
+                    [p.ravel() for p in parts]).astype(np.str_))
+                if out is not None:
+                    np.copyto(out, values, casting='unsafe')
+                    return out
+                return values
+
+            if out is None:
+                out = np.empty(nvalues,
+                    dtype=self.dtype if dtype is None else dtype)
+            start = 0
+            for part in parts:
+                # chunks of rows, copied to contiguous fields
+                rows = part if part.ndim == 2 else part[:, np.newaxis]
+                step = max(CHUNKSIZE // max(rows.shape[1], 1), 1)
+                for irow in range(0, len(rows), step):
+                    fields = np.ascontiguousarray(rows[irow:irow + step]).ravel()
+                    self._decode_fields(fields, out[start:start + fields.size])
+                    start += fields.size
+        finally:
+            # release views of data, also when decoding fails, so that a
+            # memory map of data can be closed
+            del parts
+            part = rows = fields = None
+        return out
+
+    def _decode_fields(self, fields, out):
+        '''Decode contiguous fields into out. Fields laid out as the first
+        field are converted with integer array operations, which release
+        the GIL, other fields are cast with astype.'''
+        if fields.size == 0:
+            return
+        raw = fields.view(np.uint8).reshape((fields.size, self.width))
+        plan = FieldPlan.from_field(bytes(raw[0]))
+        if plan is None:
+            _copy_values(out, self._cast(fields))
+            return
+        mantissa, exponent, negative, ok = plan.parse(raw)
+        if self.kind == 'i':
+            ok &= exponent == 0
+            values = np.where(negative, -mantissa, mantissa)
+        else:
+            if not plan.has_exponent:
+                exponent -= self.scale
+            ok &= (np.abs(exponent) <= MAXPOWER) & (mantissa <= MAXMANTISSA)
+
+            # exact mantissa and power of ten, so a single correctly rounded
+            # multiplication or division
+            power = POW10[np.minimum(np.abs(exponent), MAXPOWER)]
+            values = np.where(exponent >= 0,
+                mantissa * power, mantissa / power)
+            values = np.where(negative, -values, values)
+        if not ok.all():
+            values[~ok] = self._cast(fields[~ok])
+        _copy_values(out, values)
+
+    def _cast(self, fields):
+        if self.kind == 'i':
+            return fields.astype(np.int64)
+
+        # D exponents (1.0D+01) are read as E, on a scratch copy
+        scratch = np.array(fields, copy=True)
+        raw = scratch.view(np.uint8).reshape((scratch.size, self.width))
+        raw[(raw | 32) == ord('d')] = ord('E')
+        values = scratch.astype(np.float64)
+        if self.scale != 0:
+            # kP scale factor applies to fields without exponent
+            has_exponent = ((raw | 32) == ord('e')).any(axis=1)
+            values[~has_exponent] /= 10. ** self.scale
+        return values
+
+    def printf(self):
+        '''Format of a single value for np.savetxt, values are written with
+        the E, I or A descriptor of their kind'''
+        if self.kind == 'f':
+            return '%+{width:d}.{digits:d}E'.format(
+                width=self.width,
+                digits=self.digits or 0,
+                )
+        elif self.kind == 'i':
+            return '%{width:d}d'.format(width=self.width)
+        else:
+            return '%{width:d}s'.format(width=self.width)
+
+    def pyformat(self):
+        '''Format of a single value for str.format'''
+        if self.kind == 'f':
+            return '{{:+{width:d}.{digits:d}E}}'.format(
+                width=self.width,
+                digits=self.digits or 0,
+                )
+        elif self.kind == 'i':
+            return '{{:{width:d}d}}'.format(width=self.width)
+        else:
+            return '{{:<{width:d}}}'.format(width=self.width)
+
+
+def _copy_values(out, values):
+    '''Copy decoded values into out, raises ValueError if integer values do
+    not fit an integer out, e.g. int32 for precision 'single' '''
+    if (out.dtype.kind in 'iu') and (values.size > 0):
+        info = np.iinfo(out.dtype)
+        if (values.min() < info.min) or (values.max() > info.max):
+            raise ValueError('values out of range of {dtype:}'.format(
+                dtype=out.dtype,
+                ))
+    np.copyto(out, values, casting='unsafe')
+
+
+def get_format(text):
+    '''Compiled ArrayFormat of format string text, cached across blocks and
+    files'''
+    try:
+        return _FORMATS[text]
+    except KeyError:
+        fmt = _FORMATS[text] = ArrayFormat.parse(text)
+        return fmt
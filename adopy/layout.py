@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.formats import get_format
+
+import numpy as np
+
+from contextlib import contextmanager
+import logging
+import mmap
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+SCALAR = 1
+ARRAY = 2
+
+# decoded dtypes of real and integer arrays per precision
+PRECISIONS = {
+    'single': {'f': np.float32, 'i': np.int32},
+    'double': {'f': np.float64, 'i': np.int64},
+    }
+
+
+def parse_arrayformat(arrayformat):
+    '''Parse Fortran array format, returns (ncols, width, dtype)'''
+    fmt = get_format(arrayformat)
+    return fmt.ncols, fmt.width, fmt.dtype
+
+
+def get_dtype(format_dtype, dtype=None, precision=None):
+    '''
+    Decoded dtype of numeric array values, given the dtype of the array
+    format. An explicit dtype takes precedence over precision ('single' or
+    'double'). Text values are always decoded as strings. Integer values
+    out of range of an integer dtype raise ValueError while decoding.
+    '''
+    kind = np.dtype(format_dtype).kind
+    if kind not in 'fi':
+        return format_dtype
+    if dtype is not None:
+        return dtype
+    if precision is not None:
+        try:
+            return PRECISIONS[precision][kind]
+        except KeyError:
+            raise ValueError('precision \'{precision:}\' not implemented'.format(
+                precision=precision,
+                ))
+    return format_dtype
+
+
+class BlockLayout(object):
+    '''Byte position and format of a single block in an ado file'''
+    def __init__(self, name, blocktype, offset, data_offset, data_end, end,
+        nvalues=1, arrayformat=None, newline=1, fixed=True,
+        ):
+        self.name = name
+        self.blocktype = blocktype
+        self.offset = offset
+        self.data_offset = data_offset
+        self.data_end = data_end
+        self.end = end
+        self.nvalues = nvalues
+        self.arrayformat = arrayformat
+        self.newline = newline
+        self.fixed = fixed
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'name={s.name:}, '
+            'offset={s.offset:d}, '
+            'nvalues={s.nvalues:d}'
+            ')').format(s=self)
+
+    @property
+    def nbytes(self):
+        return self.end - self.offset
+
+
+def map_file(filepath):
+    '''Memory-map file read-only, an empty file maps to empty bytes'''
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@contextmanager
+def mapped(filepath):
+    '''Memory-map file read-only for the duration of the context'''
+    buf = map_file(filepath)
+    try:
+        yield buf
+    finally:
+        close_map(buf)
+
+
+def close_map(buf):
+    '''Close memory map buf. A map with buffers still exported, e.g. held
+    by the traceback of a failed decode, is left to garbage collection.'''
+    if isinstance(buf, mmap.mmap):
+        try:
+            buf.close()
+        except BufferError:
+            log.debug('memory map in use, not closed')
+
+
+def read_line(buf, pos):
+    '''Return line at pos without line ending and position of next line, or
+    None if the line is incomplete'''
+    end = buf.find(b'\n', pos)
+    if end < 0:
+        return None, pos
+    line = buf[pos:end]
+    if line.endswith(b'\r'):
+        line = line[:-1]
+    return bytes(line), end + 1
+
+
+def scan_blocks(buf, offset=0):
+    '''
+    Generate layouts of all complete blocks in buffer buf, starting at byte
+    offset. Lines before a block name (separators, file headers) are
+    skipped. Scanning stops at END FILE or at the first incomplete block.
+    '''
+    pos = offset
+    while True:
+        # find block name
+        start = pos
+        line, pos = read_line(buf, pos)
+        if line is None or line.startswith(b'END FILE'):
+            return
+        if not (line.startswith(b'*SET*') or line.startswith(b'*TEXT*')):
+            continue
+        name = (line.decode()
+            .replace('*SET*', '')
+            .replace('*TEXT*', '')
+            )
+
+        # block type
+        line, pos = read_line(buf, pos)
+        if line is None:
+            return
+        blocktype = int(line)
+
+        # values
+        if blocktype == SCALAR:
+            nvalues, arrayformat, fixed = 1, None, False
+            data_offset = pos
+            line, pos = read_line(buf, pos)
+            if line is None:
+                return
+            newline = 2 if buf[pos - 2:pos - 1] == b'\r' else 1
+            data_end = pos
+        elif blocktype == ARRAY:
+            line, pos = read_line(buf, pos)
+            if line is None:
+                return
+            newline = 2 if buf[pos - 2:pos - 1] == b'\r' else 1
+            nvalues, arrayformat = line.decode().split(None, 1)
+            nvalues = int(nvalues)
+            arrayformat = arrayformat.strip()
+            fmt = get_format(arrayformat)
+            data_offset = pos
+            data_end = data_offset + fmt.nbytes(nvalues, newline)
+            fixed = _is_endset(buf, data_end)
+            if not fixed:
+                # rows of varying length, count lines instead
+                nrows = -(-nvalues // fmt.ncols)
+                for irow in range(nrows):
+                    line, pos = read_line(buf, pos)
+                    if line is None:
+                        return
+                data_end = pos
+        else:
+            raise ValueError('block type {blocktype:d} not implemented'.format(
+                blocktype=blocktype,
+                ))
+
+        # endset
+        line, pos = read_line(buf, data_end)
+        if line is None:
+            return
+        if not (line == b'ENDSET' or line == b'ENDTEXT'):
+            raise ValueError('error reading block {name:}'.format(
+                name=name,
+                ))
+
+        yield BlockLayout(
+            name=name,
+            blocktype=blocktype,
+            offset=start,
+            data_offset=data_offset,
+            data_end=data_end,
+            end=pos,
+            nvalues=nvalues,
+            arrayformat=arrayformat,
+            newline=newline,
+            fixed=fixed,
+            )
+
+
+def _is_endset(buf, pos):
+    return buf[pos:pos + 6] == b'ENDSET' or buf[pos:pos + 7] == b'ENDTEXT'
+
+
+def decode_values(buf, layout, dtype=None, precision=None, base=0, out=None,
+    use_loop=False,
+    ):
+    '''Decode block values from buffer buf using block layout. The buffer
+    starts at byte base of the file, e.g. a positional read of the block.
+    Array values are decoded into out if given. With use_loop fields are
+    sliced line by line instead of from fixed-width rows.'''
+    with memoryview(buf) as view:
+        data = view[layout.data_offset - base:layout.data_end - base]
+        try:
+            if layout.blocktype == SCALAR:
+                line = bytes(data).rstrip(b'\r\n')
+                return _decode_scalar(line.decode())
+
+            fmt = get_format(layout.arrayformat)
+            return fmt.decode(data, layout.nvalues,
+                newline=layout.newline,
+                fixed=layout.fixed and not use_loop,
+                dtype=get_dtype(fmt.dtype, dtype=dtype, precision=precision),
+                out=out,
+                )
+        finally:
+            data.release()
+
+
+def decode_range(buf, layout, start, stop, dtype=None, precision=None):
+    '''Decode values start to stop of an array block. For fixed-width
+    layouts only the rows holding these values are decoded, other layouts
+    are decoded as a whole.'''
+    stop = min(stop, layout.nvalues)
+    if not layout.fixed:
+        return decode_values(buf, layout,
+            dtype=dtype, precision=precision)[start:stop]
+    fmt = get_format(layout.arrayformat)
+    ncols, rowsize = fmt.ncols, fmt.rowsize(layout.newline)
+    row0 = start // ncols
+    row1 = -(-stop // ncols)
+    data_offset = layout.data_offset + row0 * rowsize
+    rows = BlockLayout(
+        name=layout.name,
+        blocktype=layout.blocktype,
+        offset=layout.offset,
+        data_offset=data_offset,
+        data_end=min(layout.data_offset + row1 * rowsize, layout.data_end),
+        end=layout.end,
+        nvalues=min(row1 * ncols, layout.nvalues) - row0 * ncols,
+        arrayformat=layout.arrayformat,
+        newline=layout.newline,
+        fixed=True,
+        )
+    values = decode_values(buf, rows, dtype=dtype, precision=precision)
+    return values[start - row0 * ncols:stop - row0 * ncols]
+
+
+def _decode_scalar(line):
+    # try to cast as int, then float, otherwise as string array
+    try:
+        value = np.array(line, dtype=np.int64)
+    except ValueError:
+        try:
+            value = np.array(line, dtype=np.float64)
+        except ValueError:
+            value = np.array(line)
+    return value
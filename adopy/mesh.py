@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import numpy as np
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+def node_adjacency(elements, nnodes):
+    '''Node-to-node adjacency of a triangular mesh in compressed sparse row
+    format. Returns (indptr, indices), neighbours of node i are
+    indices[indptr[i]:indptr[i + 1]].'''
+    elements = np.asarray(elements)
+    src = elements[:, [0, 1, 2, 1, 2, 0]].ravel()
+    dst = elements[:, [1, 2, 0, 0, 1, 2]].ravel()
+
+    # unique directed edges, sorted by source node
+    keys = np.unique(src.astype(np.int64) * nnodes + dst)
+    src, dst = np.divmod(keys, nnodes)
+    indptr = np.zeros(nnodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=nnodes), out=indptr[1:])
+    return indptr, dst
+
+
+def _bfs_levels(indptr, indices, start, visited=None):
+    '''Breadth-first level structure from start node as list of arrays'''
+    nnodes = len(indptr) - 1
+    if visited is None:
+        visited = np.zeros(nnodes, dtype=bool)
+    else:
+        visited = visited.copy()
+    visited[start] = True
+    levels = []
+    frontier = np.array([start], dtype=np.int64)
+    while frontier.size > 0:
+        levels.append(frontier)
+        counts = indptr[frontier + 1] - indptr[frontier]
+        offsets = np.repeat(indptr[frontier] - np.cumsum(counts) + counts,
+            counts)
+        neighbours = indices[offsets + np.arange(counts.sum())]
+        neighbours = np.unique(neighbours[~visited[neighbours]])
+        visited[neighbours] = True
+        frontier = neighbours
+    return levels
+
+
+def pseudo_peripheral_node(indptr, indices, start, visited=None):
+    '''Find node far from the center of its component (George-Liu)'''
+    degree = np.diff(indptr)
+    levels = _bfs_levels(indptr, indices, start, visited)
+    while True:
+        last = levels[-1]
+        candidate = last[np.argmin(degree[last])]
+        candidate_levels = _bfs_levels(indptr, indices, candidate, visited)
+        if len(candidate_levels) <= len(levels):
+            return start
+        start, levels = candidate, candidate_levels
+
+
+def reverse_cuthill_mckee(indptr, indices):
+    '''Reverse Cuthill-McKee node ordering for bandwidth reduction. Returns
+    permutation perm, the new node i is the old node perm[i].'''
+    nnodes = len(indptr) - 1
+    degree = np.diff(indptr)
+    visited = np.zeros(nnodes, dtype=bool)
+    order = np.empty(nnodes, dtype=np.int64)
+    head = tail = 0
+    for node in np.argsort(degree, kind='stable'):
+        if visited[node]:
+            continue
+
+        # start each connected component at a pseudo-peripheral node
+        start = pseudo_peripheral_node(indptr, indices, node, visited)
+        visited[start] = True
+        order[tail] = start
+        tail += 1
+
+        # breadth-first, neighbours in order of increasing degree
+        while head < tail:
+            current = order[head]
+            head += 1
+            neighbours = indices[indptr[current]:indptr[current + 1]]
+            neighbours = neighbours[~visited[neighbours]]
+            if neighbours.size == 0:
+                continue
+            neighbours = neighbours[np.argsort(degree[neighbours],
+                kind='stable')]
+            visited[neighbours] = True
+            order[tail:tail + neighbours.size] = neighbours
+            tail += neighbours.size
+    return order[::-1].copy()
+
+
+def hilbert_index(x, y, order=16):
+    '''Position of points along a Hilbert curve through their bounding box'''
+    n = 1 << order
+    xi = _quantize(x, n)
+    yi = _quantize(y, n)
+    d = np.zeros(xi.shape, dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+
+        # rotate quadrant
+        flip = ~ry & rx
+        xi = np.where(flip, n - 1 - xi, xi)
+        yi = np.where(flip, n - 1 - yi, yi)
+        swap = ~ry
+        xi, yi = np.where(swap, yi, xi), np.where(swap, xi, yi)
+        s >>= 1
+    return d
+
+
+def hilbert_order(x, y, order=16):
+    '''Node ordering along a Hilbert curve. Returns permutation perm, the new
+    node i is the old node perm[i].'''
+    return np.argsort(hilbert_index(x, y, order=order), kind='stable')
+
+
+def _quantize(a, n):
+    a = np.asarray(a, dtype=np.float64)
+    amin, amax = a.min(), a.max()
+    if amax > amin:
+        scaled = (a - amin) / (amax - amin) * (n - 1)
+    else:
+        scaled = np.zeros_like(a)
+    return np.round(scaled).astype(np.int64)
+
+
+def points_in_polygon(x, y, polygon):
+    '''Test points (x, y) against polygon vertices (n, 2) by ray casting'''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    polygon = np.asarray(polygon, dtype=np.float64)
+    inside = np.zeros(x.shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        xcross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < xcross)
+    return inside
+
+
+def boundary_loops(elements, x, y):
+    '''Boundary edges chained into closed loops. Elements are oriented
+    counterclockwise by the sign of their twice-area with node coordinates
+    (x, y) first, so grids with mixed element orientation are chained as
+    well. Returns list of node arrays, one per loop, counterclockwise around
+    the mesh and clockwise around holes. Each loop starts at its lowest node
+    number.'''
+    elements = np.array(elements)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x1, x2, x3 = (x[elements[:, i]] for i in range(3))
+    y1, y2, y3 = (y[elements[:, i]] for i in range(3))
+    twice_area = (x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)
+    clockwise = twice_area < 0.
+    elements[clockwise] = elements[clockwise][:, [0, 2, 1]]
+    directed = np.concatenate([
+        elements[:, [0, 1]], elements[:, [1, 2]], elements[:, [2, 0]],
+        ])
+    _, inverse, counts = np.unique(np.sort(directed, axis=1), axis=0,
+        return_inverse=True, return_counts=True)
+    boundary = directed[counts[np.ravel(inverse)] == 1]
+
+    # chain edges from node to successor
+    successors = {}
+    for src, dst in boundary[np.argsort(boundary[:, 0], kind='stable')].tolist():
+        successors.setdefault(src, []).append(dst)
+    loops = []
+    for start in sorted(successors):
+        while successors[start]:
+            loop = [start]
+            node = successors[start].pop(0)
+            while node != start:
+                loop.append(node)
+                node = successors[node].pop(0)
+            loops.append(np.array(loop, dtype=np.int64))
+    return loops
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import numpy as np
+
+from pathlib import Path
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class Rasterizer(object):
+    '''
+    Linear interpolation of node values to the cell centres of a regular
+    raster. The containing element and barycentric weights of each cell centre
+    are computed once, each interpolation is then a weighted sum of three
+    gathered node values per cell. Cells outside the grid get nodata.
+    '''
+    def __init__(self, extent, cellsize, cells, nodes, weights, nodata=-9999.):
+        self.extent = extent
+        self.cellsize = cellsize
+        self.cells = cells
+        self.nodes = nodes
+        self.weights = weights
+        self.nodata = nodata
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'shape={s.shape:}, '
+            'cellsize={s.cellsize:}'
+            ')').format(s=self)
+
+    @property
+    def shape(self):
+        xmin, ymin, xmax, ymax = self.extent
+        return (
+            int(round((ymax - ymin) / self.cellsize)),
+            int(round((xmax - xmin) / self.cellsize)),
+            )
+
+    @classmethod
+    def from_grid(cls, grid, extent, cellsize, nodata=-9999., chunksize=65536):
+        '''
+        Locate raster cell centres in grid elements. The extent (xmin, ymin,
+        xmax, ymax) is expanded to a whole number of cells, rows run from
+        north to south.
+        '''
+        xmin, ymin, xmax, ymax = extent
+        ncols = int(np.ceil((xmax - xmin) / cellsize))
+        nrows = int(np.ceil((ymax - ymin) / cellsize))
+        extent = (xmin, ymax - nrows * cellsize, xmin + ncols * cellsize, ymax)
+
+        # cell column and row ranges covering each element bounding box
+        bbox = grid.bounding_boxes
+        col0 = np.maximum(np.ceil((bbox[:, 0] - xmin) / cellsize - 0.5), 0)
+        col1 = np.minimum(np.floor((bbox[:, 2] - xmin) / cellsize - 0.5),
+            ncols - 1)
+        row0 = np.maximum(np.ceil((ymax - bbox[:, 3]) / cellsize - 0.5), 0)
+        row1 = np.minimum(np.floor((ymax - bbox[:, 1]) / cellsize - 0.5),
+            nrows - 1)
+        ncells_col = np.maximum(col1 - col0 + 1, 0).astype(np.int64)
+        ncells_row = np.maximum(row1 - row0 + 1, 0).astype(np.int64)
+        col0, row0 = col0.astype(np.int64), row0.astype(np.int64)
+
+        # test candidate cells against elements in chunks of elements
+        cells, elements, weights = [], [], []
+        for start in range(0, len(bbox), chunksize):
+            chunk = slice(start, start + chunksize)
+            result = cls._locate(grid, start,
+                col0[chunk], row0[chunk], ncells_col[chunk], ncells_row[chunk],
+                xmin, ymax, ncols, cellsize,
+                )
+            cells.append(result[0])
+            elements.append(result[1])
+            weights.append(result[2])
+        cells = np.concatenate(cells)
+        elements = np.concatenate(elements)
+        weights = np.concatenate(weights)
+
+        # keep first element for cells on shared edges
+        cells, first = np.unique(cells, return_index=True)
+        nodes = grid.elements[elements[first]]
+        weights = weights[first]
+        return cls(extent, cellsize, cells, nodes, weights, nodata=nodata)
+
+    @staticmethod
+    def _locate(grid, start, col0, row0, ncells_col, ncells_row,
+        xmin, ymax, ncols, cellsize, eps=1e-9,
+        ):
+        counts = ncells_col * ncells_row
+        elements = np.repeat(np.arange(start, start + len(counts)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+            counts)
+        local_ncols = np.repeat(ncells_col, counts)
+        col = np.repeat(col0, counts) + local % local_ncols
+        row = np.repeat(row0, counts) + local // local_ncols
+        x = xmin + (col + 0.5) * cellsize
+        y = ymax - (row + 0.5) * cellsize
+
+        # barycentric weights from shape function gradients
+        origin = grid.vertex_coords[elements, 0, :]
+        operators = grid.gradient_operators[elements]
+        weights = (
+            operators[:, 0, :] * (x - origin[:, 0])[:, np.newaxis] +
+            operators[:, 1, :] * (y - origin[:, 1])[:, np.newaxis]
+            )
+        weights[:, 0] += 1.
+        inside = np.all(weights >= -eps, axis=1)
+        return (
+            (row * ncols + col)[inside],
+            elements[inside],
+            weights[inside],
+            )
+
+    def apply(self, values):
+        '''
+        Interpolate node values of shape (nnodes,) or (ntimes, nnodes) to
+        raster of shape (nrows, ncols) or (ntimes, nrows, ncols).
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        nrows, ncols = self.shape
+        raster = np.full(values.shape[:-1] + (nrows * ncols,), self.nodata)
+        raster[..., self.cells] = np.sum(
+            values[..., self.nodes] * self.weights, axis=-1)
+        return raster.reshape(values.shape[:-1] + (nrows, ncols))
+
+    def apply_blocks(self, blocks):
+        '''Generate (block, raster) for each block in a stream of blocks'''
+        for block in blocks:
+            yield block, self.apply(block.values)
+
+    def _header(self):
+        nrows, ncols = self.shape
+        xmin, ymin, xmax, ymax = self.extent
+        return [
+            ('ncols', '{:d}'.format(ncols)),
+            ('nrows', '{:d}'.format(nrows)),
+            ('xllcorner', '{:.6f}'.format(xmin)),
+            ('yllcorner', '{:.6f}'.format(ymin)),
+            ('cellsize', '{:.6f}'.format(self.cellsize)),
+            ('NODATA_value', '{:g}'.format(self.nodata)),
+            ]
+
+    def write_ascii(self, filepath, raster, fmt='%.6g'):
+        '''Write raster as ESRI ASCII grid'''
+        with open(filepath, 'w') as f:
+            for key, value in self._header():
+                f.write('{key:<14}{value:}\n'.format(key=key, value=value))
+            np.savetxt(f, raster, fmt=fmt, delimiter=' ')
+
+    def write_binary(self, filepath, raster):
+        '''Write raster as ESRI binary grid, float32 values in filepath (.flt)
+        with header in a .hdr file next to it'''
+        filepath = Path(filepath)
+        with open(filepath.with_suffix('.hdr'), 'w') as f:
+            for key, value in self._header() + [('byteorder', 'LSBFIRST')]:
+                f.write('{key:<14}{value:}\n'.format(key=key, value=value))
+        np.asarray(raster, dtype='<f4').tofile(str(filepath))
@@ -3,6 +3,8 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 from adopy.ado import AdoFile
+from adopy.raster import Rasterizer
+from adopy import mesh
 
 import numpy as np
 
@@ -30,6 +32,9 @@ TEO_NAMES = {
     'RIVERID': 'riverid',
     }
 
+# grid arrays from which the cached element geometry is computed
+GEOMETRY = ('x_nodes', 'y_nodes', 'elem1', 'elem2', 'elem3')
+
 
 class TeoGrid(object):
     def __init__(self,
@@ -66,6 +71,7 @@ class TeoGrid(object):
         self.sourcenumber = sourcenumber
         self.rivernumber = rivernumber
         self.riverid = riverid
+        self._cache = {}
 
     @classmethod
     def from_file(cls, 
@@ -109,33 +115,113 @@ class TeoGrid(object):
             riverid,
             )
 
-    def get_midpoints(self):
-        x1 = self.x_nodes[self.elem1]
-        x2 = self.x_nodes[self.elem2]
-        x3 = self.x_nodes[self.elem3]
-        y1 = self.y_nodes[self.elem1]
-        y2 = self.y_nodes[self.elem2]
-        y3 = self.y_nodes[self.elem3]
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in GEOMETRY:
+            # cached geometry is stale after assigning grid arrays
+            self.clear_cache()
+
+    def clear_cache(self):
+        '''Discard cached element geometry after modifying grid arrays in
+        place, assigning grid arrays clears the cache as well'''
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = compute()
+            value.flags.writeable = False
+            self._cache[key] = value
+            return value
+
+    @property
+    def elements(self):
+        '''Element node numbers as contiguous (nelem, 3) array'''
+        return self._cached('elements', lambda: np.ascontiguousarray(
+            np.stack([self.elem1, self.elem2, self.elem3], axis=-1)
+            ))
+
+    @property
+    def vertex_coords(self):
+        '''Element vertex coordinates as (nelem, 3, 2) array'''
+        return self._cached('vertex_coords', lambda: np.stack([
+            self.x_nodes[self.elements],
+            self.y_nodes[self.elements],
+            ], axis=-1))
+
+    @property
+    def centroids(self):
+        '''Element centroids as (nelem, 2) array'''
+        return self._cached('centroids',
+            lambda: self.vertex_coords.mean(axis=1))
+
+    @property
+    def edge_midpoints(self):
+        '''Midpoints of element edges 1-2, 2-3 and 3-1 as (nelem, 3, 2)
+        array'''
+        return self._cached('edge_midpoints', lambda: 0.5 * (
+            self.vertex_coords + np.roll(self.vertex_coords, -1, axis=1)
+            ))
+
+    @property
+    def bounding_boxes(self):
+        '''Element bounding boxes (xmin, ymin, xmax, ymax) as (nelem, 4)
+        array'''
+        return self._cached('bounding_boxes', lambda: np.concatenate([
+            self.vertex_coords.min(axis=1),
+            self.vertex_coords.max(axis=1),
+            ], axis=-1))
+
+    @property
+    def gradient_operators(self):
+        '''
+        Gradients of the linear shape functions as (nelem, 2, 3) array. The
+        gradient of node values h over element e is gradient_operators[e] @
+        h[elements[e]].
+        '''
+        def compute():
+            x = self.vertex_coords[:, :, 0]
+            y = self.vertex_coords[:, :, 1]
+            x1, x2, x3 = x[:, 0], x[:, 1], x[:, 2]
+            y1, y2, y3 = y[:, 0], y[:, 1], y[:, 2]
+            twice_area = (x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)
+            operators = np.stack([
+                np.stack([y2 - y3, y3 - y1, y1 - y2], axis=-1),
+                np.stack([x3 - x2, x1 - x3, x2 - x1], axis=-1),
+                ], axis=1)
+            return operators / twice_area[:, np.newaxis, np.newaxis]
+        return self._cached('gradient_operators', compute)
+
+    @property
+    def node_elements(self):
+        '''
+        Node-to-element index in compressed sparse row format as (indptr,
+        indices), elements of node i are indices[indptr[i]:indptr[i + 1]].
+        '''
+        def compute_indices():
+            order = np.argsort(self.elements.ravel(), kind='stable')
+            return order // 3
+
+        def compute_indptr():
+            counts = np.bincount(self.elements.ravel(),
+                minlength=len(self.x_nodes))
+            return np.concatenate([[0], np.cumsum(counts)])
+
         return (
-            (np.mean([x1, x2], axis=0), np.mean([y1, y2], axis=0)),
-            (np.mean([x1, x2], axis=0), np.mean([y1, y2], axis=0)),
-            (np.mean([x1, x2], axis=0), np.mean([y1, y2], axis=0)),
+            self._cached('node_elements_indptr', compute_indptr),
+            self._cached('node_elements_indices', compute_indices),
             )
 
+    def get_midpoints(self):
+        midpoints = self.edge_midpoints
+        return tuple(
+            (midpoints[:, i, 0].copy(), midpoints[:, i, 1].copy())
+            for i in range(3)
+            )
 
     def get_center_coords(self):
-        x1 = self.x_nodes[self.elem1]
-        x2 = self.x_nodes[self.elem2]
-        x3 = self.x_nodes[self.elem3]
-        y1 = self.y_nodes[self.elem1]
-        y2 = self.y_nodes[self.elem2]
-        y3 = self.y_nodes[self.elem3]
-
-        xc = np.mean([x1, x2, x3], axis=0)
-        yc = np.mean([y1, y2, y3], axis=0)
-
-        center_coords = np.stack([xc, yc], axis=-1)
-        return center_coords
+        return self.centroids.copy()
 
     def get_node_coords(self, nodenumber=None):
         node_coords = np.stack([self.x_nodes, self.y_nodes], axis=-1)
@@ -145,28 +231,190 @@ class TeoGrid(object):
             return node_coords[nodenumber, :]
 
     def get_elements_for_node(self, nodenumber):
-        is_elem = (
-            (nodenumber == self.elem1) |
-            (nodenumber == self.elem2) |
-            (nodenumber == self.elem3)
-            )
-        is_elem, = np.where(is_elem)
-        return is_elem
+        indptr, indices = self.node_elements
+        if not (0 <= nodenumber < len(indptr) - 1):
+            return np.array([], dtype=np.int64)
+        return indices[indptr[nodenumber]:indptr[nodenumber + 1]].copy()
 
     def get_nodes_for_element(self, elementnumber):
         yield self.elem1[elementnumber]
         yield self.elem2[elementnumber]
         yield self.elem3[elementnumber]
 
+    def get_gradients(self, heads):
+        '''
+        Gradient of node values per element. Heads has shape (nnodes,) or a
+        stack (ntimes, nnodes), the result has shape (nelem, 2) or (ntimes,
+        nelem, 2) with the x and y components in the last dimension.
+        '''
+        heads = np.asarray(heads, dtype=np.float64)
+        operators = self.gradient_operators
+        elements = self.elements
+        gradients = np.zeros(heads.shape[:-1] + operators.shape[:2])
+        for k in range(3):
+            gradients += (heads[..., elements[:, k], np.newaxis] *
+                operators[:, :, k])
+        return gradients
+
+    def get_fluxes(self, heads, conductivity):
+        '''
+        Darcy flux q = -k * grad(h) per element. Conductivity is a scalar or
+        an array of shape (nelem,), or broadcastable to the heads stack as
+        (ntimes, nelem). Returns array of shape (nelem, 2) or (ntimes, nelem,
+        2).
+        '''
+        conductivity = np.asarray(conductivity, dtype=np.float64)
+        gradients = self.get_gradients(heads)
+        return -conductivity[..., np.newaxis] * gradients
+
+    def clip(self, bbox=None, polygon=None):
+        '''
+        Extract the elements with their centroid inside bbox (xmin, ymin,
+        xmax, ymax) or polygon (n, 2) as a compacted grid. Returns the grid
+        and node_index, the new node i is the old node node_index[i]. Subset
+        node-valued blocks while reading with take_blocks(blocks, node_index,
+        nvalues=len(grid.x_nodes)). Boundary nodes of the clipped grid are the
+        nodes on its outlines, one segment per closed outline.
+        '''
+        centroids = self.centroids
+        keep = np.ones(len(centroids), dtype=bool)
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            keep &= (
+                (centroids[:, 0] >= xmin) & (centroids[:, 0] <= xmax) &
+                (centroids[:, 1] >= ymin) & (centroids[:, 1] <= ymax)
+                )
+        if polygon is not None:
+            keep &= mesh.points_in_polygon(
+                centroids[:, 0], centroids[:, 1], polygon)
+
+        # compact node numbering, removed nodes map to -1
+        elements = self.elements[keep]
+        node_index = np.unique(elements)
+        inverse = np.full(len(self.x_nodes), -1, dtype=np.int64)
+        inverse[node_index] = np.arange(node_index.size)
+        elements = inverse[elements]
+
+        # sources
+        source_nodes = inverse[self.source_nodes]
+        has_source = source_nodes >= 0
+        sourcenumber = self.sourcenumber
+        if len(sourcenumber) == len(source_nodes):
+            sourcenumber = sourcenumber[has_source]
+
+        # rivers
+        river_nodes = inverse[self.river_nodes]
+        has_river = river_nodes >= 0
+        num_nodes_river = self.num_nodes_river
+        if num_nodes_river.sum() == len(river_nodes):
+            river = np.repeat(np.arange(len(num_nodes_river)), num_nodes_river)
+            num_nodes_river = np.bincount(river[has_river],
+                minlength=len(num_nodes_river))
+
+        # boundary, one segment per closed outline
+        loops = mesh.boundary_loops(elements,
+            self.x_nodes[node_index], self.y_nodes[node_index])
+        if loops:
+            boundary_nodes = np.concatenate(loops)
+        else:
+            boundary_nodes = np.array([], dtype=np.int64)
+        boundary_segments = np.array([len(loop) for loop in loops],
+            dtype=np.int64)
+
+        # header
+        counts = {
+            'NUMBER NODES': node_index.size,
+            'NUMBER ELEMENTS': len(elements),
+            'NUMBER RIVER NODES': int(has_river.sum()),
+            'NUMBER SOURCE NODES': int(has_source.sum()),
+            'NUMBER BOUNDARY NODES': boundary_nodes.size,
+            }
+        header = [(k, counts.get(k, v)) for k, v in self.header]
+
+        grid = self.__class__(
+            header,
+            self.x_nodes[node_index],
+            self.y_nodes[node_index],
+            elements[:, 0],
+            elements[:, 1],
+            elements[:, 2],
+            self.elem_area[keep],
+            self.nia[node_index],
+            source_nodes[has_source],
+            num_nodes_river,
+            river_nodes[has_river],
+            boundary_nodes,
+            boundary_segments,
+            sourcenumber,
+            self.rivernumber,
+            self.riverid,
+            )
+        return grid, node_index
+
+    def rasterizer(self, extent, cellsize, nodata=-9999.):
+        '''
+        Create Rasterizer for interpolating node values to a regular raster
+        with extent (xmin, ymin, xmax, ymax) and square cells.
+        '''
+        return Rasterizer.from_grid(self, extent, cellsize, nodata=nodata)
+
     def is_boundary_node(self, nodenumber):
         return nodenumber in self.boundary_nodes
 
+    def get_bandwidth(self):
+        elements = self.elements
+        return int((elements.max(axis=1) - elements.min(axis=1)).max())
+
+    def reorder(self, method='rcm'):
+        '''
+        Renumber nodes for locality using reverse Cuthill-McKee ('rcm') or
+        Hilbert curve ('hilbert') ordering. Returns the renumbered grid and
+        permutation perm, the new node i is the old node perm[i]. Apply perm
+        to node-valued ado or flo blocks with AdoBlock.take or take_blocks.
+        '''
+        if method == 'rcm':
+            indptr, indices = mesh.node_adjacency(self.elements,
+                len(self.x_nodes))
+            perm = mesh.reverse_cuthill_mckee(indptr, indices)
+        elif method == 'hilbert':
+            perm = mesh.hilbert_order(self.x_nodes, self.y_nodes)
+        else:
+            raise ValueError('reorder method \'{method:}\' not implemented'.format(
+                method=method,
+                ))
+        return self.renumber(perm), perm
+
+    def renumber(self, perm):
+        '''Create grid with node i equal to node perm[i] of this grid'''
+        perm = np.asarray(perm)
+        inverse = np.empty_like(perm)
+        inverse[perm] = np.arange(perm.size)
+        return self.__class__(
+            self.header,
+            self.x_nodes[perm],
+            self.y_nodes[perm],
+            inverse[self.elem1],
+            inverse[self.elem2],
+            inverse[self.elem3],
+            self.elem_area,
+            self.nia[perm],
+            inverse[self.source_nodes],
+            self.num_nodes_river,
+            inverse[self.river_nodes],
+            inverse[self.boundary_nodes],
+            self.boundary_segments,
+            self.sourcenumber,
+            self.rivernumber,
+            self.riverid,
+            )
+
 
 class TeoFile(AdoFile):
-    def read(self, use_loop=False):
+    def read(self, use_loop=False, dtype=None, precision=None):
         self.reset_file()
         header = self._read_header()
-        blocks = super().read_blocks(use_loop=use_loop)
+        blocks = super().read_blocks(use_loop=use_loop,
+            dtype=dtype, precision=precision)
 
         grid_kwargs = {}
         for block in blocks:
@@ -176,17 +424,21 @@ class TeoFile(AdoFile):
 
     def _read_header(self):
         # skip first line
-        line = next(self.lines)
+        line = self._next_line()
 
         # read header items
         header = []
-        line = next(self.lines)
-        while not line.startswith('---'):
+        line = self._next_line()
+        while (line is not None) and not line.startswith('---'):
             key, value = line.split('=')
             key = key.strip()
             value = int(value)
             header.append((key, value))
-            line = next(self.lines)
+            line = self._next_line()
+        if line is None:
+            raise ValueError('error reading header of {f.name:}'.format(
+                f=self.filepath,
+                ))
 
         return header
 
@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.ado import AdoFile
+from adopy.layout import decode_values, mapped, scan_blocks
+
+import numpy as np
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+# block names of the pathline columns, each chunk of pathline points is a
+# group of consecutive array blocks with one block per column. Experimental:
+# names and layout are assumed, not verified against Triwaco output.
+TRO_NAMES = {
+    'PARTICLE': 'particle',
+    'X': 'x',
+    'Y': 'y',
+    'Z': 'z',
+    'TIME': 'time',
+    }
+
+COLUMNS = ('particle', 'x', 'y', 'z', 'time')
+
+
+class Pathlines(object):
+    '''Pathline points as columnar arrays'''
+    __slots__ = COLUMNS
+
+    def __init__(self, particle, x, y, z, time):
+        self.particle = particle
+        self.x = x
+        self.y = y
+        self.z = z
+        self.time = time
+
+    def __len__(self):
+        return len(self.particle)
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'npoints={npoints:d}, '
+            'nparticles={nparticles:d}'
+            ')').format(s=self,
+                npoints=len(self),
+                nparticles=len(self.particle_ids),
+                )
+
+    @property
+    def particle_ids(self):
+        return np.unique(self.particle)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.array([], dtype=np.int64),
+            *[np.array([], dtype=np.float64) for c in COLUMNS[1:]]
+            )
+
+    @classmethod
+    def concatenate(cls, chunks):
+        chunks = list(chunks)
+        if not chunks:
+            return cls.empty()
+        return cls(*[
+            np.concatenate([getattr(chunk, c) for chunk in chunks])
+            for c in COLUMNS
+            ])
+
+    def select(self, mask):
+        return self.__class__(*[getattr(self, c)[mask] for c in COLUMNS])
+
+    def get_particle(self, particle):
+        return self.select(self.particle == particle)
+
+
+class TroFile(AdoFile):
+    '''
+    Reader for trace (.tro) pathline files. Pathline points are stored as
+    groups of ado array blocks, one block per column named as in TRO_NAMES.
+    Blocks are located with the block layout scan and decoded one chunk at a
+    time, columns of a chunk without selected points are not decoded.
+    '''
+    def __init__(self, filepath, mode='r', names=None):
+        super().__init__(filepath, mode=mode)
+        self.names = names or TRO_NAMES
+
+    def read(self, particles=None, bbox=None):
+        return Pathlines.concatenate(
+            self.read_chunks(particles=particles, bbox=bbox))
+
+    def read_chunks(self, particles=None, bbox=None):
+        '''
+        Generate Pathlines per chunk, filtered on particle ids and bounding
+        box (xmin, ymin, xmax, ymax) while parsing.
+        '''
+        with mapped(self.filepath) as buf:
+            for group in self._groups(scan_blocks(buf)):
+                chunk = self._read_chunk(buf, group, particles, bbox)
+                if len(chunk) > 0:
+                    yield chunk
+
+    def _groups(self, layouts):
+        group = {}
+        for layout in layouts:
+            column = self.names.get(layout.name.strip())
+            if column is None:
+                continue
+            if column in group:
+                yield group
+                group = {}
+            group[column] = layout
+        if group:
+            yield group
+
+    def _read_chunk(self, buf, group, particles, bbox):
+        columns = {}
+
+        def column(name):
+            if name not in columns:
+                if name in group:
+                    columns[name] = decode_values(buf, group[name])
+                else:
+                    columns[name] = np.full(npoints, np.nan)
+            return columns[name]
+
+        npoints = group['particle'].nvalues
+        mask = np.ones(npoints, dtype=bool)
+        if particles is not None:
+            mask &= np.isin(column('particle'), particles)
+        if (bbox is not None) and mask.any():
+            xmin, ymin, xmax, ymax = bbox
+            x, y = column('x'), column('y')
+            mask &= (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        if not mask.any():
+            return Pathlines.empty()
+        return Pathlines(*[column(c)[mask] for c in COLUMNS])
@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.formats import ArrayFormat
+from adopy.layout import SCALAR
+
+import numpy as np
+
+import logging
+import mmap
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+SEPARATOR = 72*'-' + '\n'
+
+# rows of values formatted per chunk
+CHUNKROWS = 4096
+
+
+def values_dtype(values):
+    try:
+        return values.dtype
+    except AttributeError:
+        return np.array(values).dtype
+
+
+class BlockFormat(object):
+    '''
+    Text layout of blocks as written by AdoFile: separator, name, block
+    type, scalar value or array header with fixed-width rows of values, and
+    end of set, with lines ending in newline. The byte size of a block
+    follows from its header and number of values, values are formatted in
+    chunks of rows.
+    '''
+    def __init__(self, ncols=6, width=14, precision=6, newline='\n'):
+        self.ncols = ncols
+        self.width = width
+        self.precision = precision
+        self.newline = newline
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'ncols={s.ncols:d}, '
+            'width={s.width:d}, '
+            'precision={s.precision:d}'
+            ')').format(s=self)
+
+    def array_format(self, dtype):
+        return ArrayFormat.for_dtype(dtype,
+            self.ncols, self.width, self.precision)
+
+    def name_line(self, name, dtype):
+        if dtype.type is np.str_:
+            prefix = 'TEXT'
+        else:
+            prefix = 'SET'
+        return '*{prefix:}*{name:}'.format(
+            prefix=prefix,
+            name=name.upper(),
+            ) + self.newline
+
+    def blocktype_line(self, blocktype):
+        return '{blocktype:d}'.format(
+            blocktype=getattr(blocktype, 'value', blocktype),
+            ) + self.newline
+
+    def scalar_line(self, value, dtype):
+        if dtype.kind == 'f':
+            valuetext = '{value:9.6f}'.format(value=value)
+        elif dtype.kind in 'iu':
+            valuetext = '{value:d}'.format(value=value)
+        else:
+            valuetext = '{value:}'.format(value=value)
+        return valuetext + self.newline
+
+    def arrayheader_line(self, nvalues, dtype):
+        return '{nvalues:<10d}{formattext:}'.format(
+            nvalues=nvalues,
+            formattext=self.array_format(dtype).text,
+            ) + self.newline
+
+    def endset_line(self, dtype):
+        if dtype.type is np.str_:
+            suffix = 'TEXT'
+        else:
+            suffix = 'SET'
+        return 'END{suffix:}'.format(suffix=suffix) + self.newline
+
+    def header(self, block, separator=True):
+        dtype = values_dtype(block.values)
+        lines = [
+            SEPARATOR.replace('\n', self.newline) if separator else '',
+            self.name_line(block.name, dtype),
+            self.blocktype_line(block.blocktype),
+            ]
+        if getattr(block.blocktype, 'value', block.blocktype) == SCALAR:
+            lines.append(self.scalar_line(block.values, dtype))
+        else:
+            lines.append(self.arrayheader_line(np.size(block.values), dtype))
+        return ''.join(lines)
+
+    def nbytes(self, block, separator=True):
+        '''Byte size of formatted block without formatting its values'''
+        dtype = values_dtype(block.values)
+        size = len(self.header(block, separator=separator).encode())
+        if getattr(block.blocktype, 'value', block.blocktype) != SCALAR:
+            size += self.array_format(dtype).nbytes(np.size(block.values),
+                newline=len(self.newline))
+        return size + len(self.endset_line(dtype).encode())
+
+    def rows(self, values, dtype):
+        '''Generate formatted rows of array values in chunks of CHUNKROWS
+        rows. Raises ValueError if values overflow the field width.'''
+        fmt = self.array_format(dtype)
+        values = np.ravel(values)
+        rowsize = fmt.rowsize(len(self.newline))
+        rowformat = fmt.printf() * self.ncols + self.newline
+        chunksize = CHUNKROWS * self.ncols
+        nfull = values.size - values.size % self.ncols
+        for start in range(0, nfull, chunksize):
+            chunk = values[start:min(start + chunksize, nfull)]
+            nrows = chunk.size // self.ncols
+            text = (rowformat * nrows) % tuple(chunk.tolist())
+            self._check(text, nrows * rowsize)
+            yield text
+        remainder = values[nfull:]
+        if remainder.size > 0:
+            text = (fmt.printf() * remainder.size + self.newline) % tuple(
+                remainder.tolist())
+            self._check(text, remainder.size * self.width + len(self.newline))
+            yield text
+
+    def _check(self, text, size):
+        if len(text) != size:
+            raise ValueError('values do not fit format ({width:d} wide)'.format(
+                width=self.width,
+                ))
+
+    def chunks(self, block, separator=True):
+        '''Generate formatted block as encoded chunks'''
+        dtype = values_dtype(block.values)
+        yield self.header(block, separator=separator).encode()
+        if getattr(block.blocktype, 'value', block.blocktype) != SCALAR:
+            for text in self.rows(block.values, dtype):
+                yield text.encode()
+        yield self.endset_line(dtype).encode()
+
+    def format(self, block, separator=True):
+        '''Formatted block as bytes, raises ValueError if values overflow
+        the field width'''
+        return b''.join(self.chunks(block, separator=separator))
+
+
+def write_region(filepath, offset, size, block, blockformat):
+    '''
+    Format block in chunks of rows straight into the file region of size
+    bytes at offset, through a memory map of that region only. Raises
+    ValueError if the formatted block does not fit the region.
+    '''
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with open(filepath, 'r+b') as f:
+        with mmap.mmap(f.fileno(), offset + size - start, offset=start) as buf:
+            pos = offset - start
+            end = pos + size
+            for chunk in blockformat.chunks(block):
+                if pos + len(chunk) > end:
+                    break
+                buf[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+            if pos != end:
+                raise ValueError('block {name:} does not fit region'.format(
+                    name=block.name,
+                    ))
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import numpy as np
+
+import logging
+import os
+
+log = logging.getLogger(os.path.basename(__file__))
+
+
+class ZoneIndex(object):
+    '''
+    Precomputed index for reducing node values to zone statistics. Nodes are
+    sorted by zone once, so each reduction is a single gather followed by a
+    segmented reduction over all zones. Weights, e.g. the node influence
+    areas TeoGrid.nia, are used by the sum and mean statistics.
+    '''
+    def __init__(self, zones, weights=None, nodata=None):
+        zones = np.asarray(zones)
+        if weights is None:
+            weights = np.ones(zones.shape, dtype=np.float64)
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+
+        # sort nodes by zone, dropping nodes without zone
+        nodes = np.arange(zones.size)
+        if nodata is not None:
+            nodes = nodes[zones != nodata]
+        self.order = nodes[np.argsort(zones[nodes], kind='stable')]
+        self.zones, self.starts = np.unique(zones[self.order],
+            return_index=True,
+            )
+        self.weights = weights[self.order]
+        self.total_weights = np.add.reduceat(self.weights, self.starts)
+        self.nnodes = zones.size
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}('
+            'nnodes={s.nnodes:d}, '
+            'nzones={nzones:d}'
+            ')').format(s=self, nzones=len(self.zones))
+
+    @classmethod
+    def from_grid(cls, grid, zones, nodata=None):
+        return cls(zones, weights=grid.nia, nodata=nodata)
+
+    def reduce(self, values, statistic='mean'):
+        '''
+        Reduce node values of shape (nnodes,) or (ntimes, nnodes) to zone
+        values of shape (nzones,) or (ntimes, nzones), ordered as self.zones.
+        '''
+        values = np.asarray(values)
+        if values.shape[-1] != self.nnodes:
+            raise ValueError('expected {nnodes:d} node values, got {nvalues:d}'.format(
+                nnodes=self.nnodes,
+                nvalues=values.shape[-1],
+                ))
+        sorted_values = values[..., self.order]
+        if statistic == 'sum':
+            return np.add.reduceat(sorted_values * self.weights, self.starts,
+                axis=-1)
+        elif statistic == 'mean':
+            return np.add.reduceat(sorted_values * self.weights, self.starts,
+                axis=-1) / self.total_weights
+        elif statistic == 'min':
+            return np.minimum.reduceat(sorted_values, self.starts, axis=-1)
+        elif statistic == 'max':
+            return np.maximum.reduceat(sorted_values, self.starts, axis=-1)
+        else:
+            raise ValueError('statistic \'{statistic:}\' not implemented'.format(
+                statistic=statistic,
+                ))
+
+    def reduce_blocks(self, blocks, statistic='mean', names=None):
+        '''
+        Reduce a stream of ado or flo blocks, e.g. from TransientFloFile.read,
+        one block at a time. Returns dictionary of (times, table) per block
+        name, with table of shape (ntimes, nzones). Times are nan for blocks
+        without time. Unless selected by names, scalar blocks and blocks of
+        another size than nnodes are skipped.
+        '''
+        times = {}
+        rows = {}
+        for block in blocks:
+            if names is None:
+                if (np.ndim(block.values) == 0) or (
+                        np.size(block.values) != self.nnodes):
+                    continue
+            elif block.name not in names:
+                continue
+            times.setdefault(block.name, []).append(
+                getattr(block, 'time', np.nan))
+            rows.setdefault(block.name, []).append(
+                self.reduce(block.values, statistic=statistic))
+        return {
+            name: (np.array(times[name]), np.stack(rows[name]))
+            for name in rows
+            }
@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# Time of import adopy in a fresh interpreter, best of a number of runs,
+# checked against a target. Submodules and NumPy are loaded on first
+# attribute access, which is checked by tests/test_import.py.
+
+import subprocess
+import sys
+import os
+
+NRUNS = 10
+
+# target for import adopy, in seconds
+IMPORT_TARGET = 0.02
+
+IMPORT_SCRIPT = '''
+import time
+start = time.perf_counter()
+import adopy
+print(time.perf_counter() - start)
+'''
+
+
+def import_time():
+    rootdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT],
+        cwd=rootdir,
+        universal_newlines=True,
+        )
+    return float(output)
+
+
+if __name__ == '__main__':
+    elapsed = min(import_time() for i in range(NRUNS))
+    print('import adopy: {elapsed:.1f} ms, target: {target:.0f} ms'.format(
+        elapsed=elapsed * 1e3,
+        target=IMPORT_TARGET * 1e3,
+        ))
+    sys.exit(1 if elapsed > IMPORT_TARGET else 0)
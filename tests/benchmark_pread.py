@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+# Throughput of concurrent block reads from a single open ado file with
+# an increasing number of threads. Decoding releases the GIL, which is
+# checked by the progress of a competing Python thread during a decode,
+# and thread scaling is checked against the number of available cores.
+
+import adopy
+from adopy.ado import AdoBlock, BlockType
+
+import numpy as np
+
+import threading
+import tempfile
+import time
+import sys
+import os
+
+NBLOCKS = 32
+NVALUES = 200_000
+
+# required share of idle progress of a Python thread during decoding
+MIN_PROGRESS = 0.5
+
+# required share of linear speedup up to the number of cores
+MIN_EFFICIENCY = 0.6
+
+
+def spin(counter, stop):
+    while not stop.is_set():
+        counter[0] += 1
+
+
+def progress(func, duration=0.3):
+    '''Progress of a spinning Python thread while running func, relative to
+    its progress when idle'''
+    rates = []
+    for target in (lambda: time.sleep(duration), func):
+        counter, stop = [0], threading.Event()
+        spinner = threading.Thread(target=spin, args=(counter, stop))
+        spinner.start()
+        start = time.perf_counter()
+        target()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        spinner.join()
+        rates.append(counter[0] / elapsed)
+    return rates[1] / rates[0]
+
+
+def read_all(src, workers):
+    for block in src.read_concurrent(workers=workers):
+        pass
+
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    adofile = os.path.join(tmpdir, 'benchmark.ado')
+    rng = np.random.RandomState(0)
+    blocks = [
+        AdoBlock('block{i:d}'.format(i=i), BlockType.ARRAY, rng.rand(NVALUES))
+        for i in range(NBLOCKS)
+        ]
+    with adopy.open(adofile, 'w') as dst:
+        dst.write(blocks)
+    size = os.path.getsize(adofile) / 1e6
+    ncores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+        else os.cpu_count()
+
+    with adopy.open(adofile) as src:
+        src.open_positional()
+        src.layouts
+        share = progress(lambda: read_all(src, 1))
+        print('cores: {ncores:d}, python progress during decode: {share:.0%}'.format(
+            ncores=ncores,
+            share=share,
+            ))
+
+        elapsed = {}
+        for workers in (1, 2, 4, 8):
+            start = time.perf_counter()
+            read_all(src, workers)
+            elapsed[workers] = time.perf_counter() - start
+            print('threads: {workers:d}, throughput: {throughput:8.1f} MB/s, '
+                'speedup: {speedup:4.2f}'.format(
+                workers=workers,
+                throughput=size / elapsed[workers],
+                speedup=elapsed[1] / elapsed[workers],
+                ))
+
+    failed = share < MIN_PROGRESS
+    for workers, seconds in elapsed.items():
+        expected = min(workers, ncores)
+        if elapsed[1] / seconds < MIN_EFFICIENCY * expected:
+            print('threads: {workers:d}, speedup below {speedup:.2f}'.format(
+                workers=workers,
+                speedup=MIN_EFFICIENCY * expected,
+                ))
+            failed = True
+    sys.exit(1 if failed else 0)
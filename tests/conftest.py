@@ -0,0 +1,32 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.ado import BlockType
+from adopy.flo import TransientAdoBlock
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def write_transient():
+    '''
+    Function write(path, times, values) writing a transient flo file with
+    TransientFloFile.write. Values are a dictionary of (ntimes, nvalues)
+    arrays per parameter name, or a single array for PHI1. Blocks are
+    written per time, in order of the parameter names.
+    '''
+    def write(path, times, values):
+        if not isinstance(values, dict):
+            values = {'PHI1': values}
+        blocks = [
+            TransientAdoBlock(name, time, BlockType.ARRAY,
+                np.asarray(values[name][itime]))
+            for itime, time in enumerate(times)
+            for name in values
+            ]
+        with adopy.open_flo(path, 'w', transient=True) as dst:
+            dst.write(blocks)
+    return write
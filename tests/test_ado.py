@@ -83,4 +83,264 @@ class TestAdoFile(object):
             assert block.blocktype.value == block2.blocktype.value
             assert block.values.shape == block2.values.shape
             assert block.values.dtype == block2.values.dtype
-            assert np.isclose(block.values.max(), block2.values.max())
\ No newline at end of file
+            assert np.isclose(block.values.max(), block2.values.max())
+
+    def test_scan(self, destfile):
+        values = np.arange(15, dtype=float) / 7.
+        blocks = [
+            adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY, values),
+            adopy.ado.AdoBlock('second', adopy.ado.BlockType.ARRAY,
+                np.arange(5)),
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks)
+
+        with adopy.open(destfile) as src:
+            layouts = src.scan()
+        assert [l.name for l in layouts] == ['FIRST', 'SECOND']
+        assert [l.nvalues for l in layouts] == [15, 5]
+        assert all(l.fixed for l in layouts)
+        with adopy.layout.mapped(destfile) as buf:
+            first = adopy.layout.decode_values(buf, layouts[0])
+            second = adopy.layout.decode_values(buf, layouts[1])
+        assert np.allclose(first, values)
+        assert np.array_equal(second, np.arange(5))
+
+    def test_read_concurrent(self, destfile):
+        rng = np.random.RandomState(7)
+        blocks = [
+            adopy.ado.AdoBlock('block{i:d}'.format(i=i),
+                adopy.ado.BlockType.ARRAY, rng.rand(1000 + i))
+            for i in range(16)
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks)
+
+        with adopy.open(destfile) as src:
+            concurrent = list(src.read_concurrent(workers=4))
+            selected = list(src.read_concurrent(names=['BLOCK3'], workers=2))
+            sequential = list(src.read())
+        assert [bl.name for bl in concurrent] == [bl.name for bl in sequential]
+        for block, expected in zip(concurrent, sequential):
+            assert np.array_equal(block.values, expected.values)
+        assert len(selected) == 1
+        assert np.allclose(selected[0].values, blocks[3].values)
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_write_parallel(self, tmpdir, workers):
+        rng = np.random.RandomState(8)
+        blocks = [
+            adopy.ado.AdoBlock('values', adopy.ado.BlockType.ARRAY,
+                rng.rand(1001) * 1e3),
+            adopy.ado.AdoBlock('ids', adopy.ado.BlockType.ARRAY,
+                np.arange(24)),
+            adopy.ado.AdoBlock('count', adopy.ado.BlockType.SCALAR, 12),
+            ]
+        sequential = tmpdir.join('sequential.ado')
+        parallel = tmpdir.join('parallel.ado')
+        with adopy.open(sequential, mode='w') as dst:
+            dst.write(list(blocks))
+        with adopy.open(parallel, mode='w') as dst:
+            dst.write_parallel(blocks, workers=workers)
+        assert parallel.read_binary() == sequential.read_binary()
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_write_parallel_overflow(self, destfile, workers):
+        blocks = [
+            adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(10)),
+            adopy.ado.AdoBlock('ids', adopy.ado.BlockType.ARRAY,
+                np.array([1, 10 ** 12])),
+            adopy.ado.AdoBlock('last', adopy.ado.BlockType.ARRAY,
+                np.arange(10)),
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks[:1], width=8)
+            with pytest.raises(ValueError):
+                dst.write_parallel(blocks, workers=workers, width=8)
+        with adopy.open(destfile) as src:
+            assert [bl.name for bl in src.read()] == ['FIRST']
+
+    def test_read_dtype(self, destfile):
+        blocks = [
+            adopy.ado.AdoBlock('values', adopy.ado.BlockType.ARRAY,
+                np.linspace(0., 1., 50)),
+            adopy.ado.AdoBlock('ids', adopy.ado.BlockType.ARRAY,
+                np.arange(20)),
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks)
+        with adopy.open(destfile) as src:
+            single = src.as_dict(precision='single')
+            looped = list(src.read(use_loop=True, precision='single'))
+            explicit = src.as_dict(dtype=np.float32)
+            concurrent = list(src.read_concurrent(precision='single'))
+        for values in (single, {bl.name: bl for bl in looped},
+                {bl.name: bl for bl in concurrent}):
+            assert values['VALUES'].values.dtype == np.float32
+            assert values['IDS'].values.dtype == np.int32
+        assert explicit['IDS'].values.dtype == np.float32
+        assert np.allclose(single['VALUES'].values, blocks[0].values)
+
+        # single precision blocks are written with their number format
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(list(single.values()))
+        with adopy.open(destfile) as src:
+            roundtrip = src.as_dict()
+        assert roundtrip['VALUES'].values.dtype == np.float64
+        assert np.array_equal(roundtrip['IDS'].values, np.arange(20))
+
+    def test_read_block_framed(self, destfile):
+        blocks = [
+            adopy.ado.AdoBlock('count', adopy.ado.BlockType.SCALAR, 3),
+            adopy.ado.AdoBlock('values', adopy.ado.BlockType.ARRAY,
+                np.arange(13, dtype=float) / 3.),
+            adopy.ado.AdoBlock('labels', adopy.ado.BlockType.ARRAY,
+                np.array(['a', 'bb', 'ccc'])),
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks)
+        with open(destfile, 'rb') as f:
+            data = f.read()
+        with open(destfile, 'wb') as f:
+            f.write(data.replace(b'\n', b'\r\n'))
+
+        for use_loop in (False, True):
+            with adopy.open(destfile) as src:
+                count = src.read_block()
+                values = src.read_block(use_loop=use_loop)
+                labels = src.read_block(use_loop=use_loop)
+                with pytest.raises(StopIteration):
+                    src.read_block()
+            assert count.values == 3
+            assert values.blocktype is adopy.ado.BlockType.ARRAY
+            assert np.allclose(values.values, blocks[1].values)
+            assert list(labels.values) == ['a', 'bb', 'ccc']
+
+    def test_update_block(self, destfile):
+        blocks = [
+            adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(15, dtype=float)),
+            adopy.ado.AdoBlock('second', adopy.ado.BlockType.ARRAY,
+                np.arange(7)),
+            adopy.ado.AdoBlock('third', adopy.ado.BlockType.SCALAR, 2.5),
+            ]
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write(blocks)
+        with open(destfile, 'rb') as f:
+            original = f.read()
+
+        # same size, in place
+        with adopy.open(destfile, mode='r+') as dst:
+            layouts = dst.scan()
+            dst.update_block('FIRST', np.arange(15, dtype=float) * 2.)
+            assert dst.scan()[1].offset == layouts[1].offset
+        with open(destfile, 'rb') as f:
+            updated = f.read()
+        assert len(updated) == len(original)
+        assert updated[layouts[1].offset:] == original[layouts[1].offset:]
+
+        # other size, rewritten
+        with adopy.open(destfile, mode='r+') as dst:
+            dst.update_block('SECOND', np.arange(20))
+            values = dst.as_dict()
+        assert np.allclose(values['FIRST'].values, np.arange(15) * 2.)
+        assert np.array_equal(values['SECOND'].values, np.arange(20))
+        assert values['THIRD'].values == 2.5
+
+    def test_update_block_mode(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(5))])
+        with adopy.open(destfile) as src:
+            with pytest.raises(ValueError):
+                src.update_block('FIRST', np.arange(5))
+        with adopy.open(destfile, mode='r+') as dst:
+            with pytest.raises(ValueError):
+                dst.update_block('MISSING', np.arange(5))
+
+    def test_update_block_overflow(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(20))], width=8)
+        with open(destfile, 'rb') as f:
+            original = f.read()
+        with adopy.open(destfile, mode='r+') as dst:
+            with pytest.raises(ValueError):
+                dst.update_block('FIRST', np.full(20, 10 ** 12))
+        with open(destfile, 'rb') as f:
+            assert f.read() == original
+        assert not os.path.exists(str(destfile) + '.tmp')
+
+    def test_update_block_kind(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([
+                adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                    np.arange(20)),
+                adopy.ado.AdoBlock('second', adopy.ado.BlockType.ARRAY,
+                    np.arange(3)),
+                ], ncols=10, width=8)
+        values = np.linspace(0., 1e6, 20)
+        with adopy.open(destfile, mode='r+') as dst:
+            dst.update_block('FIRST', values)
+            assert dst.read_block().name == 'FIRST'
+            blocks = dst.as_dict()
+        assert np.allclose(blocks['FIRST'].values, values)
+        assert np.array_equal(blocks['SECOND'].values, np.arange(3))
+
+    def test_update_block_crlf(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([
+                adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                    np.arange(15, dtype=float)),
+                adopy.ado.AdoBlock('second', adopy.ado.BlockType.SCALAR, 2),
+                ])
+        with open(destfile, 'rb') as f:
+            original = f.read().replace(b'\n', b'\r\n')
+        with open(destfile, 'wb') as f:
+            f.write(original)
+
+        # same size, in place
+        with adopy.open(destfile, mode='r+') as dst:
+            dst.update_block('FIRST', np.arange(15, dtype=float) * 2.)
+        with open(destfile, 'rb') as f:
+            updated = f.read()
+        assert len(updated) == len(original)
+        assert updated.count(b'\n') == updated.count(b'\r\n')
+
+        # other size, rewritten
+        with adopy.open(destfile, mode='r+') as dst:
+            dst.update_block('SECOND', 20)
+            values = dst.as_dict()
+        with open(destfile, 'rb') as f:
+            updated = f.read()
+        assert updated.count(b'\n') == updated.count(b'\r\n')
+        assert np.allclose(values['FIRST'].values, np.arange(15) * 2.)
+        assert values['SECOND'].values == 20
+
+    def test_lines(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(7))])
+        with open(destfile, 'a') as f:
+            f.write('END FILE')
+        with adopy.open(destfile) as src:
+            lines = list(src.lines)
+        assert lines[1] == '*SET*FIRST'
+        assert lines[-1] == 'END FILE'
+        assert len(lines) == 8
+
+    def test_read_malformed(self, destfile):
+        with adopy.open(destfile, mode='w') as dst:
+            dst.write([adopy.ado.AdoBlock('first', adopy.ado.BlockType.ARRAY,
+                np.arange(12.))])
+        with open(destfile) as f:
+            text = f.read()
+        with open(destfile, 'w') as f:
+            f.write(text.replace('+1.000000E+00', '+1.0000X0E+00', 1))
+        with pytest.raises(ValueError):
+            with adopy.open(destfile) as src:
+                src.read_block()
+        with pytest.raises(ValueError):
+            with adopy.open(destfile) as src:
+                list(src.read_selection())
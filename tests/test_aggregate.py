@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.aggregate import P2Quantile, TemporalAggregator
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def transientflofile(tmpdir, write_transient):
+    flofile = tmpdir.join('transient.flo')
+    rng = np.random.RandomState(9)
+    times = np.arange(1., 61.)
+    phi = rng.normal(size=(len(times), 25)) + np.arange(25.)
+    write_transient(flofile, times, {'PHI1': phi, 'PHI2': phi + 100.})
+    return flofile, times, phi
+
+
+class TestP2Quantile(object):
+    def test_median(self):
+        values = np.random.RandomState(10).normal(size=(2000, 3)) * [1., 2., 4.]
+        quantile = P2Quantile(0.5, 3)
+        for row in values:
+            quantile.update(row)
+        assert np.allclose(quantile.result(), np.median(values, axis=0),
+            atol=0.1)
+
+    def test_few_values(self):
+        quantile = P2Quantile(0.1, 2)
+        for row in ([1., 4.], [3., 2.], [2., 3.]):
+            quantile.update(np.array(row))
+        assert np.allclose(quantile.result(), [1.2, 2.2])
+
+
+class TestTemporalAggregator(object):
+    def test_bins(self):
+        aggregator = TemporalAggregator([0., 10., 20., 30.],
+            ['mean', 'min', 'max', 'count'])
+        for time in (1., 5., 12., 14., 16.):
+            aggregator.update(time, np.array([time, -time]))
+        aggregator.update(40., np.array([1e9, 1e9]))
+        result = aggregator.result()
+        assert np.allclose(result['mean'][:2], [[3., -3.], [14., -14.]])
+        assert np.allclose(result['max'][1], [16., -12.])
+        assert np.allclose(result['count'][:2, 0], [2, 3])
+        assert np.all(np.isnan(result['min'][2]))
+
+    def test_time_order(self):
+        aggregator = TemporalAggregator([0., 10., 20.], ['p50'])
+        aggregator.update(15., np.zeros(2))
+        with pytest.raises(ValueError):
+            aggregator.update(5., np.zeros(2))
+
+
+class TestAggregate(object):
+    def test_aggregate(self, transientflofile):
+        flofile, times, phi = transientflofile
+        bins = [0.5, 30.5, 60.5]
+        with adopy.open_flo(flofile, transient=True) as src:
+            result = src.aggregate({'PHI1': ['mean', 'min', 'max', 'p50']},
+                bins)
+        assert list(result) == ['PHI1']
+        phi1 = result['PHI1']
+        assert phi1['mean'].shape == (2, 25)
+        assert np.allclose(phi1['mean'][0], phi[:30].mean(axis=0), atol=1e-5)
+        assert np.allclose(phi1['min'][1], phi[30:].min(axis=0), atol=1e-5)
+        assert np.allclose(phi1['max'][1], phi[30:].max(axis=0), atol=1e-5)
+        assert np.allclose(phi1['p50'][0], np.median(phi[:30], axis=0),
+            atol=0.5)
@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.ado import AdoBlock, BlockType
+from adopy.cli import main
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def transientflofile(tmpdir, write_transient):
+    flofile = tmpdir.join('transient.flo')
+    values = np.random.RandomState(3).rand(3, 2, 20)
+    write_transient(flofile, (1005., 1010., 1015.),
+        {'PHI1': values[:, 0], 'PHI2': values[:, 1]})
+    with adopy.open_flo(flofile, transient=True) as src:
+        blocks = list(src.read())
+    return flofile, blocks
+
+
+class TestCli(object):
+    def test_info(self, transientflofile, capsys):
+        flofile, blocks = transientflofile
+        main(['info', str(flofile), '--names', 'PHI2'])
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 3
+        assert lines[0].startswith('PHI2,TIME: 1005.0000')
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_stats(self, transientflofile, capsys, workers):
+        flofile, blocks = transientflofile
+        main(['stats', str(flofile), '--workers', str(workers)])
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == len(blocks) + 1
+        mean = float(lines[1].split()[-2])
+        assert np.isclose(mean, blocks[0].values.mean(), rtol=1e-5)
+
+    def test_extract(self, transientflofile, tmpdir):
+        flofile, blocks = transientflofile
+        output = tmpdir.join('extract.flo')
+        main(['extract', str(flofile), str(output), '--names', 'PHI1',
+            '--tmin', '1010', '--nodes', '1', '3', '20'])
+        with adopy.open_flo(output, transient=True) as src:
+            extracted = list(src.read())
+        assert [bl.time for bl in extracted] == [1010., 1015.]
+        assert np.allclose(extracted[0].values, blocks[2].values[[0, 2, 19]])
+
+    def test_convert_npz(self, transientflofile, tmpdir):
+        flofile, blocks = transientflofile
+        npzfile = tmpdir.join('transient.npz')
+        adofile = tmpdir.join('roundtrip.flo')
+        main(['convert', str(flofile), str(npzfile)])
+        main(['convert', str(npzfile), str(adofile)])
+        with np.load(str(npzfile)) as npz:
+            assert len(npz.files) == len(blocks)
+        with adopy.open_flo(adofile, transient=True) as src:
+            converted = list(src.read())
+        assert [(bl.name, bl.time) for bl in converted] == [
+            (bl.name, bl.time) for bl in blocks]
+        assert np.allclose(converted[-1].values, blocks[-1].values)
+
+    def test_convert_split(self, transientflofile, tmpdir):
+        flofile, blocks = transientflofile
+        outdir = tmpdir.join('split')
+        main(['convert', str(flofile), str(outdir), '--split'])
+        with adopy.open_flo(outdir.join('PHI2.ado'), transient=True) as src:
+            phi2 = list(src.read())
+        assert len(phi2) == 3
+        assert np.allclose(phi2[0].values, blocks[1].values)
+
+    def test_cat(self, transientflofile, tmpdir):
+        flofile, blocks = transientflofile
+        output = tmpdir.join('cat.flo')
+        main(['cat', str(flofile), str(flofile), '-o', str(output),
+            '--tmax', '1005'])
+        with adopy.open_flo(output, transient=True) as src:
+            concatenated = list(src.read())
+        assert len(concatenated) == 4
+        assert np.array_equal(concatenated[2].values, blocks[0].values)
+
+    def test_cat_steady(self, tmpdir):
+        flofile = tmpdir.join('steady.flo')
+        output = tmpdir.join('cat.flo')
+        blocks = [
+            AdoBlock('PHI1', BlockType.ARRAY, np.arange(20.)),
+            AdoBlock('QBO1', BlockType.ARRAY, np.arange(20.) * 2.),
+            ]
+        with adopy.open_flo(flofile, 'w') as dst:
+            dst.write(blocks)
+        main(['cat', str(flofile), '-o', str(output)])
+        assert output.read_binary() == flofile.read_binary()
+        with adopy.open_flo(output) as src:
+            assert list(src.as_dict()) == ['PHI1', 'QBO1']
+
+    def test_convert_error(self, transientflofile, tmpdir, capsys):
+        flofile, blocks = transientflofile
+        with pytest.raises(SystemExit):
+            main(['convert', str(flofile), str(tmpdir.join('out.ado'))])
+        assert '--split' in capsys.readouterr().err
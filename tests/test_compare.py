@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def reference(tmpdir, write_transient):
+    rng = np.random.RandomState(3)
+    times = [1005., 1010.]
+    phi = rng.rand(len(times), 137)
+    path = tmpdir.join('reference.flo')
+    write_transient(path, times, phi)
+    return path, times, phi
+
+
+class TestDiff(object):
+    def test_equal(self, reference, tmpdir, write_transient):
+        path, times, phi = reference
+        other = tmpdir.join('other.flo')
+        write_transient(other, times, phi)
+        results = adopy.diff(path, other, chunksize=10)
+        assert len(results) == 2
+        assert all(r.ok for r in results)
+        assert results[0].time == pytest.approx(1005.)
+        assert results[0].nvalues == 137
+
+    def test_differ(self, reference, tmpdir, write_transient):
+        path, times, phi = reference
+        changed = phi.copy()
+        changed[1, [3, 42, 130]] += [0.1, -0.2, 0.3]
+        other = tmpdir.join('other.flo')
+        write_transient(other, times, changed)
+        results = adopy.diff(path, other, chunksize=10, atol=1e-4)
+        assert results[0].ok
+        result = results[1]
+        assert result.status == 'differ'
+        assert result.nfail == 3
+        assert result.first_nodes == [3, 42, 130]
+        assert result.max_abs == pytest.approx(0.3, rel=1e-4)
+        assert result.mean_abs == pytest.approx(0.6 / 137, rel=1e-3)
+        assert result.rms == pytest.approx(np.sqrt(0.14 / 137), rel=1e-3)
+
+    def test_missing(self, reference, tmpdir, write_transient):
+        path, times, phi = reference
+        other = tmpdir.join('other.flo')
+        write_transient(other, times[:1], phi[:1])
+        results = adopy.diff(path, other)
+        assert [r.status for r in results] == ['ok', 'missing']
+
+    def test_fail_fast(self, reference, tmpdir, write_transient):
+        path, times, phi = reference
+        other = tmpdir.join('other.flo')
+        write_transient(other, times, phi + 1.)
+        results = adopy.diff(path, other, fail_fast=True)
+        assert len(results) == 1
+        assert results[0].status == 'differ'
+
+    def test_nan(self, reference, tmpdir, write_transient):
+        path, times, phi = reference
+        changed = phi.copy()
+        changed[0, 5] = np.nan
+        other = tmpdir.join('other.flo')
+        write_transient(other, times, changed)
+        results = adopy.diff(path, other)
+        assert results[0].status == 'differ'
+        assert results[0].first_nodes == [5]
+        assert results[0].max_abs == 0.
+
+        results = adopy.diff(other, other)
+        assert results[0].ok
+        results = adopy.diff(other, other, equal_nan=False)
+        assert results[0].nfail == 1
+
+    def test_varying_rows(self, tmpdir):
+        paths = []
+        # trailing blanks, rows are not fixed-width
+        rows = [' 1 2 3  ', ' 4 5 6']
+        for i, last in enumerate([' 7', ' 8']):
+            path = tmpdir.join('rows{i:d}.ado'.format(i=i))
+            with open(path, 'w') as f:
+                f.write('*SET*VALUES\n2\n7         (3I2)\n')
+                f.write(''.join(row + '\n' for row in rows + [last]))
+                f.write('ENDSET\n')
+            paths.append(path)
+        results = adopy.diff(*paths, chunksize=2)
+        assert results[0].status == 'differ'
+        assert results[0].first_nodes == [6]
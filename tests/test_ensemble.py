@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.ado import AdoBlock, BlockType
+
+import numpy as np
+import pytest
+
+
+def write_steady(path, phi, qbo):
+    blocks = [
+        AdoBlock('PHI1, STEADY-STATE==', BlockType.ARRAY, phi),
+        AdoBlock('QBO1, STEADY-STATE==', BlockType.ARRAY, qbo),
+        ]
+    with adopy.open_flo(path, 'w') as dst:
+        dst.write(blocks)
+
+
+@pytest.fixture
+def steadyflofiles(tmpdir):
+    rng = np.random.RandomState(1)
+    members = []
+    for i in range(4):
+        path = tmpdir.join('member{i:d}.flo'.format(i=i))
+        phi, qbo = rng.rand(2, 125)
+        write_steady(path, phi, qbo)
+        members.append((path, phi, qbo))
+    return members
+
+
+@pytest.fixture
+def transientflofiles(tmpdir, write_transient):
+    rng = np.random.RandomState(2)
+    times = [1005., 1010., 1015.]
+    members = []
+    for i in range(3):
+        path = tmpdir.join('member{i:d}.flo'.format(i=i))
+        phi = rng.rand(len(times), 50)
+        write_transient(path, times, phi)
+        members.append((path, phi))
+    return times, members
+
+
+class TestReadEnsemble(object):
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_read_steady(self, steadyflofiles, workers):
+        paths = [path for path, phi, qbo in steadyflofiles]
+        stacks = adopy.read_ensemble(paths, names=['PHI1'], workers=workers)
+        assert list(stacks) == ['PHI1']
+        assert stacks['PHI1'].shape == (4, 125)
+        expected = np.stack([phi for path, phi, qbo in steadyflofiles])
+        assert np.allclose(stacks['PHI1'], expected, rtol=1e-6)
+
+    def test_read_steady_as_dict(self, steadyflofiles):
+        paths = [path for path, phi, qbo in steadyflofiles]
+        stacks = adopy.read_ensemble(paths, workers=1)
+        with adopy.open_flo(paths[2]) as src:
+            flo = src.as_dict()
+        assert set(stacks) == set(flo)
+        assert np.array_equal(stacks['QBO1'][2], flo['QBO1'].values)
+
+    def test_read_transient(self, transientflofiles):
+        times, members = transientflofiles
+        paths = [path for path, phi in members]
+        stacks = adopy.read_ensemble(paths, transient=True, workers=1)
+        assert list(stacks) == [('PHI1', time) for time in times]
+        for itime, time in enumerate(times):
+            expected = np.stack([phi[itime] for path, phi in members])
+            assert np.allclose(stacks[('PHI1', time)], expected, rtol=1e-6)
+
+    def test_read_transient_times(self, transientflofiles, write_transient):
+        times, members = transientflofiles
+        paths = [path for path, phi in members]
+
+        # same size, time steps in other order
+        path, phi = members[1]
+        write_transient(path, times[::-1], phi[::-1])
+        stacks = adopy.read_ensemble(paths, transient=True, workers=1)
+        for itime, time in enumerate(times):
+            expected = np.stack([phi[itime] for path, phi in members])
+            assert np.allclose(stacks[('PHI1', time)], expected, rtol=1e-6)
+
+        # same size, other time steps
+        write_transient(path, [t + 1000. for t in times], phi)
+        with pytest.raises(ValueError):
+            adopy.read_ensemble(paths, transient=True, workers=1)
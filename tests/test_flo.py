@@ -40,4 +40,81 @@ class TestSteadyFloFile(object):
 class TestTransientFloFile(object):
     def test_read(self, transientflofile):
         with adopy.open_flo(transientflofile, transient=True) as src:
-            flo = src.read()
\ No newline at end of file
+            flo = src.read()
+
+    def test_follow(self, tmpdir, write_transient):
+        flofile = tmpdir.join('running.flo')
+        times = np.array([1005., 1010.])
+        write_transient(flofile, times, np.arange(20.) + times[:, np.newaxis])
+        with open(flofile, 'rb') as f:
+            content = f.read()
+
+        # first block complete, second block partially written
+        split = content.index(b'*SET*PHI1,TIME: 1010') + 60
+        with open(flofile, 'wb') as f:
+            f.write(content[:split])
+
+        with adopy.open_flo(flofile, transient=True) as src:
+            followed = src.follow(poll_interval=0.01, timeout=0.1)
+            block = next(followed)
+            assert (block.name, block.time) == ('PHI1', 1005.)
+            with open(flofile, 'ab') as f:
+                f.write(content[split:])
+            block = next(followed)
+            assert (block.name, block.time) == ('PHI1', 1010.)
+            assert np.allclose(block.values, np.arange(20.) + 1010.)
+            assert list(followed) == []
+
+    def test_read_concurrent(self, tmpdir, write_transient):
+        flofile = tmpdir.join('transient.flo')
+        times = np.array([1005., 1010.])
+        values = np.arange(30.) * times[:, np.newaxis]
+        write_transient(flofile, times, {'PHI1': values, 'PHI2': values})
+        with adopy.open_flo(flofile, transient=True) as src:
+            phi2 = list(src.read_concurrent(names=['PHI2'], workers=2))
+        assert [(bl.name, bl.time) for bl in phi2] == [
+            ('PHI2', 1005.), ('PHI2', 1010.)]
+        assert np.allclose(phi2[1].values, np.arange(30.) * 1010.)
+
+    def test_read_stacks(self, tmpdir, write_transient):
+        flofile = tmpdir.join('transient.flo')
+        times = [1005., 1010., 1015., 1020.]
+        values = np.arange(30.) * np.array(times)[:, np.newaxis]
+        write_transient(flofile, times, {'PHI1': values, 'PHI2': values + 1.})
+        with adopy.open_flo(flofile, transient=True) as src:
+            stacks = src.read_stacks(names=['PHI2'])
+            phi1 = [bl for bl in src.read() if bl.name == 'PHI1']
+            all_stacks = src.read_stacks()
+        stack = stacks['PHI2']
+        assert list(stacks) == ['PHI2']
+        assert stack.values.shape == (4, 30)
+        assert stack.values.flags.c_contiguous
+        assert np.array_equal(stack.times, times)
+        assert np.allclose(stack.values[:, 2], np.array(times) * 2. + 1.)
+        view = stack[1]
+        assert (view.name, view.time) == ('PHI2', 1010.)
+        assert np.shares_memory(view.values, stack.values)
+        selected = stack.sel(tmin=1010., tmax=1015., nodes=[0, 5])
+        assert np.array_equal(selected.times, [1010., 1015.])
+        assert selected.values.shape == (2, 2)
+        for block, view in zip(phi1, all_stacks['PHI1']):
+            assert block.time == view.time
+            assert np.array_equal(block.values, view.values)
+
+    def test_write_parallel(self, tmpdir):
+        flofile = tmpdir.join('transient.flo')
+        records = [
+            {'name': 'PHI1', 'time': time, 'blocktype': 2,
+                'values': np.arange(40.) + time}
+            for time in (1005., 1010., 11005.)
+            ]
+        with adopy.open_flo(flofile, 'w', transient=True) as dst:
+            dst.write_parallel(records=records, workers=2)
+        with adopy.open_flo(flofile, transient=True) as src:
+            blocks = list(src.read())
+        assert [bl.time for bl in blocks] == [1005., 1010., 11005.]
+        assert np.allclose(blocks[2].values, np.arange(40.) + 11005.)
+        sequential = tmpdir.join('sequential.flo')
+        with adopy.open_flo(sequential, 'w', transient=True) as dst:
+            dst.write(records=records)
+        assert flofile.read_binary() == sequential.read_binary()
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.formats import ArrayFormat, get_format
+
+import numpy as np
+import pytest
+
+
+def write_array(path, arrayformat, rows, nvalues):
+    with open(path, 'w') as f:
+        f.write(72*'-' + '\n')
+        f.write('*SET*VALUES\n')
+        f.write('2\n')
+        f.write('{nvalues:<10d}{arrayformat:}\n'.format(
+            nvalues=nvalues,
+            arrayformat=arrayformat,
+            ))
+        for row in rows:
+            f.write(row + '\n')
+        f.write('ENDSET\n')
+
+
+class TestArrayFormat(object):
+    @pytest.mark.parametrize('text, ncols, descriptor, width, digits', [
+        ('(6E14.6)', 6, 'E', 14, 6),
+        ('(5I10)', 5, 'I', 10, None),
+        ('(10A8)', 10, 'A', 8, None),
+        ('(4F12.4)', 4, 'F', 12, 4),
+        ('(3D22.14)', 3, 'D', 22, 14),
+        ('(1P6G14.6)', 6, 'G', 14, 6),
+        ('(1P,5ES15.6E3)', 5, 'ES', 15, 6),
+        ])
+    def test_parse(self, text, ncols, descriptor, width, digits):
+        fmt = ArrayFormat.parse(text)
+        assert fmt.ncols == ncols
+        assert fmt.descriptor == descriptor
+        assert fmt.width == width
+        assert fmt.digits == digits
+
+    def test_parse_invalid(self):
+        with pytest.raises(ValueError):
+            ArrayFormat.parse('(6X14)')
+
+    def test_cached(self):
+        assert get_format('(6E14.6)') is get_format('(6E14.6)')
+
+    def test_decode_fixed(self):
+        data = b'  1.50  2.25\n -3.00\n'
+        fmt = get_format('(2F6.2)')
+        values = fmt.decode(data, 3)
+        assert np.allclose(values, [1.5, 2.25, -3.])
+
+    def test_decode_d(self, tmpdir):
+        path = tmpdir.join('double.ado')
+        write_array(path, '(3D12.4)',
+            ['  0.1000D+01 -0.2500D+02  0.3000d-01', '  0.4000D+00'], 4)
+        with adopy.open(path) as src:
+            block = src.read_block()
+        assert np.allclose(block.values, [1., -25., 0.03, 0.4])
+
+    def test_decode_g_scaled_f(self, tmpdir):
+        path = tmpdir.join('general.ado')
+        write_array(path, '(2G12.4)', ['  0.1000E+01      2.5000'], 2)
+        with adopy.open(path) as src:
+            assert np.allclose(src.read_block().values, [1., 2.5])
+
+        path = tmpdir.join('scaled.ado')
+        write_array(path, '(1P2F8.2)', ['   15.00  -20.00'], 2)
+        with adopy.open(path) as src:
+            assert np.allclose(src.read_block().values, [1.5, -2.])
+
+    def test_decode_scale(self):
+        # kP scales fields without exponent only
+        fmt = get_format('(1P3G12.4)')
+        values = fmt.decode(b'  0.1500E+01     15.0000  0.2500D+01\n', 3)
+        assert np.allclose(values, [1.5, 1.5, 2.5])
+        fmt = get_format('(1P2F12.4)')
+        values = fmt.decode(b'     15.0000  1.5000E+00\n', 2)
+        assert np.allclose(values, [1.5, 1.5])
+
+    def test_decode_int_range(self):
+        fmt = get_format('(2I14)')
+        data = b'             1   10000000000\n'
+        assert fmt.decode(data, 2).tolist() == [1, 10 ** 10]
+        with pytest.raises(ValueError):
+            fmt.decode(data, 2, dtype=np.int32)
+        with pytest.raises(ValueError):
+            fmt.decode(data, 2, fixed=False, dtype=np.int32)
+
+    def test_encode(self):
+        fmt = ArrayFormat.for_dtype(np.float64, ncols=6, width=14, precision=6)
+        assert fmt.text == '(6E14.6)'
+        assert fmt.printf() == '%+14.6E'
+        assert fmt.nbytes(13) == 2 * (6 * 14 + 1) + 14 + 1
+        assert ArrayFormat.for_dtype(np.int32, 5, 10).text == '(5I10)'
@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import subprocess
+import sys
+import os
+
+IMPORT_SCRIPT = '''
+import sys
+import adopy
+print(','.join(sorted(m for m in sys.modules
+    if (m == 'numpy') or m.startswith('adopy.'))))
+'''
+
+
+def run_import():
+    rootdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT],
+        cwd=rootdir,
+        universal_newlines=True,
+        )
+    return output.strip()
+
+
+class TestImport(object):
+    def test_lazy_modules(self):
+        assert run_import() == ''
+
+    def test_lazy_attributes(self):
+        import adopy
+        assert adopy.AdoFile is adopy.ado.AdoFile
+        assert adopy.read_ensemble is adopy.ensemble.read_ensemble
+        assert 'TeoFile' in dir(adopy)
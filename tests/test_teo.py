@@ -31,4 +31,265 @@ class TestTeoFile(object):
         assert grid.x_nodes.dtype == np.float
         assert header['NUMBER RIVER NODES'] == 13773
         assert grid.river_nodes.shape == (13773,)
-        assert grid.river_nodes.dtype == np.int     
\ No newline at end of file
+        assert grid.river_nodes.dtype == np.int
+
+    @pytest.mark.parametrize('precision', [None, 'single'])
+    def test_read_precision(self, gridfile, precision):
+        teofile, expected = gridfile
+        with adopy.open_grid(teofile) as src:
+            grid = src.read(precision=precision)
+        if precision == 'single':
+            assert grid.x_nodes.dtype == np.float32
+            assert grid.elem1.dtype == np.int32
+        else:
+            assert grid.x_nodes.dtype == np.float64
+            assert grid.elem1.dtype == np.int64
+        assert np.allclose(grid.x_nodes, expected.x_nodes)
+        assert np.array_equal(grid.elements, expected.elements)
+        assert np.array_equal(grid.source_nodes, expected.source_nodes)
+
+
+def make_grid(nx=12, ny=9, seed=0, mixed=False):
+    '''Regular triangulated grid with arbitrary node numbering, with every
+    other element clockwise if mixed'''
+    xx, yy = np.meshgrid(np.arange(nx, dtype=float), np.arange(ny, dtype=float))
+    x_nodes, y_nodes = xx.ravel(), yy.ravel()
+    node = np.arange(nx * ny).reshape((ny, nx))
+    n1, n2 = node[:-1, :-1].ravel(), node[:-1, 1:].ravel()
+    n3, n4 = node[1:, 1:].ravel(), node[1:, :-1].ravel()
+    elements = np.concatenate([
+        np.stack([n1, n2, n3], axis=-1),
+        np.stack([n1, n3, n4], axis=-1),
+        ])
+    if mixed:
+        elements[::2] = elements[::2, ::-1]
+    boundary = np.concatenate([
+        node[0, :-1], node[:-1, -1], node[-1, :0:-1], node[:0:-1, 0],
+        ])
+    river = node[ny // 2, :]
+
+    # shuffle node numbers
+    perm = np.random.RandomState(seed).permutation(nx * ny)
+    inverse = np.empty_like(perm)
+    inverse[perm] = np.arange(perm.size)
+    elements = inverse[elements]
+    elem_area = np.full(len(elements), 0.5)
+    nia = np.bincount(elements.ravel(), minlength=nx * ny) * 0.5 / 3.
+    header = [
+        ('NUMBER NODES', nx * ny),
+        ('NUMBER ELEMENTS', len(elements)),
+        ('NUMBER RIVER NODES', len(river)),
+        ]
+    return adopy.teo.TeoGrid(
+        header,
+        x_nodes[perm],
+        y_nodes[perm],
+        elements[:, 0],
+        elements[:, 1],
+        elements[:, 2],
+        elem_area,
+        nia,
+        np.array([], dtype=int),
+        np.array([len(river)]),
+        inverse[river],
+        inverse[boundary],
+        np.array([len(boundary)]),
+        np.array([], dtype=int),
+        np.array([1]),
+        np.array([1]),
+        )
+
+
+def write_teo(teofile, grid):
+    '''Write grid in teo format, with one-based node numbers'''
+    one_based = {'elem1', 'elem2', 'elem3', 'source_nodes', 'river_nodes',
+        'boundary_nodes'}
+    with adopy.open(teofile, 'w') as dst:
+        dst.f.write('GRID FILE\n')
+        for key, value in grid.header:
+            dst.f.write('{key:} = {value:d}\n'.format(key=key, value=value))
+        for name, key in adopy.teo.TEO_NAMES.items():
+            values = getattr(grid, key)
+            if key in one_based:
+                values = values + 1
+            dst.write_block(adopy.ado.AdoBlock(name, adopy.ado.BlockType.ARRAY,
+                values))
+        dst.f.write('END FILE GRIDFL\n')
+
+
+@pytest.fixture
+def grid():
+    return make_grid()
+
+
+@pytest.fixture
+def gridfile(tmpdir, grid):
+    teofile = tmpdir.join('grid.teo')
+    grid.source_nodes = np.array([3, 5])
+    grid.sourcenumber = np.array([1, 2])
+    write_teo(teofile, grid)
+    return teofile, grid
+
+
+class TestTeoGrid(object):
+    @pytest.mark.parametrize('method', ['rcm', 'hilbert'])
+    def test_reorder(self, grid, method):
+        reordered, perm = grid.reorder(method=method)
+        assert np.array_equal(np.sort(perm), np.arange(len(grid.x_nodes)))
+        assert np.array_equal(reordered.x_nodes, grid.x_nodes[perm])
+        assert np.array_equal(
+            reordered.x_nodes[reordered.elem1], grid.x_nodes[grid.elem1])
+        assert np.array_equal(
+            reordered.y_nodes[reordered.river_nodes],
+            grid.y_nodes[grid.river_nodes],
+            )
+        assert reordered.get_bandwidth() < grid.get_bandwidth()
+
+    def test_reorder_blocks(self, grid):
+        reordered, perm = grid.reorder()
+        block = adopy.ado.AdoBlock('X', adopy.ado.BlockType.ARRAY,
+            grid.x_nodes)
+        taken, = adopy.ado.take_blocks([block], perm)
+        assert np.array_equal(taken.values, reordered.x_nodes)
+        assert block.values is grid.x_nodes
+
+    def test_geometry(self, grid):
+        assert grid.elements.shape == (len(grid.elem1), 3)
+        assert grid.elements.flags.c_contiguous
+        assert grid.centroids is grid.centroids
+        centroids = grid.get_center_coords()
+        centroids -= centroids.min(axis=0)
+        assert not np.shares_memory(centroids, grid.centroids)
+        centroids = grid.get_center_coords()
+        assert np.allclose(centroids[:, 0], (grid.x_nodes[grid.elem1] +
+            grid.x_nodes[grid.elem2] + grid.x_nodes[grid.elem3]) / 3.)
+        (x12, y12), (x23, y23), (x31, y31) = grid.get_midpoints()
+        assert np.allclose(x23, (grid.x_nodes[grid.elem2] +
+            grid.x_nodes[grid.elem3]) / 2.)
+        assert np.allclose(y31, (grid.y_nodes[grid.elem3] +
+            grid.y_nodes[grid.elem1]) / 2.)
+        bbox = grid.bounding_boxes
+        assert np.all(bbox[:, 2] - bbox[:, 0] == 1.)
+
+    def test_gradient_operators(self, grid):
+        heads = 2. * grid.x_nodes - 3. * grid.y_nodes
+        gradient = np.einsum('eij,ej->ei',
+            grid.gradient_operators, heads[grid.elements])
+        assert np.allclose(gradient, [2., -3.])
+
+    def test_get_elements_for_node(self, grid):
+        for node in (0, 7, len(grid.x_nodes) - 1):
+            expected, = np.where(
+                (grid.elem1 == node) | (grid.elem2 == node) |
+                (grid.elem3 == node)
+                )
+            assert np.array_equal(grid.get_elements_for_node(node), expected)
+        for node in (-1, len(grid.x_nodes)):
+            assert grid.get_elements_for_node(node).size == 0
+
+    def test_cache_setattr(self, grid):
+        centroids = grid.centroids
+        grid.x_nodes = grid.x_nodes + 10.
+        assert np.allclose(grid.centroids[:, 0], centroids[:, 0] + 10.)
+        node_coords = grid.get_node_coords()
+        node_coords[:, 0] -= 10.
+        assert np.allclose(grid.x_nodes.min(), 10.)
+
+    def test_get_gradients(self, grid):
+        heads = np.stack([
+            2. * grid.x_nodes - 3. * grid.y_nodes,
+            -1. * grid.x_nodes + 0.5 * grid.y_nodes,
+            ])
+        gradients = grid.get_gradients(heads)
+        assert gradients.shape == (2, len(grid.elem1), 2)
+        assert np.allclose(gradients[0], [2., -3.])
+        assert np.allclose(gradients[1], [-1., 0.5])
+        assert np.allclose(grid.get_gradients(heads[1]), gradients[1])
+
+    def test_get_fluxes(self, grid):
+        heads = 2. * grid.x_nodes - 3. * grid.y_nodes
+        conductivity = np.full(len(grid.elem1), 5.)
+        fluxes = grid.get_fluxes(heads, conductivity)
+        assert np.allclose(fluxes, [-10., 15.])
+        assert np.allclose(grid.get_fluxes(heads, 5.), fluxes)
+
+    def test_rasterizer(self, grid, tmpdir):
+        rasterizer = grid.rasterizer((-2., -1., 7., 4.), 0.5)
+        assert rasterizer.shape == (10, 18)
+        heads = np.stack([
+            2. * grid.x_nodes - 3. * grid.y_nodes,
+            grid.x_nodes * 0. + 1.,
+            ])
+        raster = rasterizer.apply(heads)
+        assert raster.shape == (2, 10, 18)
+
+        # cell centres west of x = 0 and south of y = 0 are outside the grid
+        assert np.all(raster[:, :, :4] == -9999.)
+        assert np.all(raster[:, -2:, :] == -9999.)
+        xc = -2. + (np.arange(18) + 0.5) * 0.5
+        yc = 4. - (np.arange(10) + 0.5) * 0.5
+        expected = 2. * xc[np.newaxis, :] - 3. * yc[:, np.newaxis]
+        assert np.allclose(raster[0, :-2, 4:], expected[:-2, 4:])
+        assert np.allclose(raster[1, :-2, 4:], 1.)
+
+        ascfile = tmpdir.join('heads.asc')
+        rasterizer.write_ascii(ascfile, raster[0])
+        assert np.allclose(np.loadtxt(str(ascfile), skiprows=6), raster[0],
+            rtol=1e-5)
+        fltfile = tmpdir.join('heads.flt')
+        rasterizer.write_binary(fltfile, raster[0])
+        assert np.allclose(np.fromfile(str(fltfile), dtype='<f4').reshape(
+            (10, 18)), raster[0], rtol=1e-6)
+
+    def test_clip(self, grid):
+        clipped, node_index = grid.clip(bbox=(2., 1., 6., 5.))
+        assert np.array_equal(clipped.x_nodes, grid.x_nodes[node_index])
+        assert clipped.x_nodes.min() == 2. and clipped.x_nodes.max() == 6.
+        assert clipped.y_nodes.min() == 1. and clipped.y_nodes.max() == 5.
+        assert len(clipped.x_nodes) == 5 * 5
+        assert len(clipped.elem1) == 2 * 4 * 4
+        assert clipped.elements.max() == len(clipped.x_nodes) - 1
+        assert len(clipped.boundary_nodes) == 16
+        assert clipped.boundary_segments.tolist() == [16]
+        boundary = clipped.boundary_nodes
+        dx = np.diff(clipped.x_nodes[np.append(boundary, boundary[0])])
+        dy = np.diff(clipped.y_nodes[np.append(boundary, boundary[0])])
+        assert np.all(np.hypot(dx, dy) == 1.)
+        assert np.all(clipped.y_nodes[clipped.river_nodes] == 4.)
+        assert clipped.num_nodes_river.tolist() == [5]
+        assert dict(clipped.header)['NUMBER NODES'] == 25
+
+    def test_clip_outlines(self, grid):
+        polygon = [(0., 0.), (3., 0.), (3., 2.7), (7., 2.7), (7., 0.),
+            (10., 0.), (10., 3.), (0., 3.)]
+        clipped, node_index = grid.clip(polygon=polygon)
+        assert clipped.boundary_segments.tolist() == [12, 12]
+        x = clipped.x_nodes[clipped.boundary_nodes]
+        assert np.all(x[:12] <= 3.) and np.all(x[12:] >= 7.) or (
+            np.all(x[:12] >= 7.) and np.all(x[12:] <= 3.))
+
+    def test_clip_mixed(self):
+        grid = make_grid(mixed=True)
+        clipped, node_index = grid.clip(bbox=(2., 1., 6., 5.))
+        assert clipped.boundary_segments.tolist() == [16]
+        boundary = clipped.boundary_nodes
+        x = clipped.x_nodes[np.append(boundary, boundary[0])]
+        y = clipped.y_nodes[np.append(boundary, boundary[0])]
+        assert np.all(np.hypot(np.diff(x), np.diff(y)) == 1.)
+
+        # counterclockwise outline
+        assert (x[:-1] * y[1:] - x[1:] * y[:-1]).sum() > 0.
+
+    def test_clip_polygon(self, grid):
+        polygon = [(0., 0.), (10.5, 0.), (0., 7.7)]
+        clipped, node_index = grid.clip(polygon=polygon)
+        is_inside = lambda c: c[:, 0] / 10.5 + c[:, 1] / 7.7 < 1.
+        assert np.all(is_inside(clipped.centroids))
+        assert len(clipped.elem1) == is_inside(grid.centroids).sum()
+        block = adopy.ado.AdoBlock('PHI1', adopy.ado.BlockType.ARRAY,
+            grid.y_nodes)
+        scalar = adopy.ado.AdoBlock('ITER', adopy.ado.BlockType.SCALAR, 3)
+        taken, passed = adopy.ado.take_blocks([block, scalar], node_index,
+            nvalues=len(grid.x_nodes))
+        assert np.array_equal(taken.values, clipped.y_nodes)
+        assert passed.values == 3
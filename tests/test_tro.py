@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.ado import AdoBlock, BlockType
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def trofile(tmpdir):
+    trofile = tmpdir.join('trace.tro')
+    rng = np.random.RandomState(6)
+    blocks = []
+    chunks = []
+    for ichunk in range(3):
+        particle = np.repeat(np.arange(4) + 4 * ichunk + 1, 10)
+        x, y, z = rng.rand(3, particle.size) * 100.
+        time = np.tile(np.arange(10.), 4)
+        chunks.append((particle, x, y, z, time))
+        for name, values in zip(('PARTICLE', 'X', 'Y', 'Z', 'TIME'),
+                (particle, x, y, z, time)):
+            blocks.append(AdoBlock(name, BlockType.ARRAY, values))
+    with adopy.open(trofile, 'w') as dst:
+        dst.write(blocks)
+    columns = [np.concatenate(c) for c in zip(*chunks)]
+    return trofile, columns
+
+
+class TestTroFile(object):
+    def test_read(self, trofile):
+        trofile, (particle, x, y, z, time) = trofile
+        with adopy.open_trace(trofile) as src:
+            pathlines = src.read()
+        assert len(pathlines) == 120
+        assert np.array_equal(pathlines.particle, particle)
+        assert np.allclose(pathlines.x, x)
+        assert np.allclose(pathlines.time, time)
+        assert np.array_equal(pathlines.particle_ids, np.arange(1, 13))
+
+    def test_read_chunks(self, trofile):
+        trofile, (particle, x, y, z, time) = trofile
+        with adopy.open_trace(trofile) as src:
+            chunks = list(src.read_chunks(particles=[2, 3]))
+        assert len(chunks) == 1
+        assert np.array_equal(np.unique(chunks[0].particle), [2, 3])
+        assert np.allclose(chunks[0].get_particle(3).z, z[particle == 3])
+
+    def test_read_bbox(self, trofile):
+        trofile, (particle, x, y, z, time) = trofile
+        with adopy.open_trace(trofile) as src:
+            pathlines = src.read(particles=np.arange(5, 13),
+                bbox=(0., 0., 50., 50.))
+        expected = (particle >= 5) & (x <= 50.) & (y <= 50.)
+        assert len(pathlines) == expected.sum()
+        assert np.allclose(pathlines.y, y[expected])
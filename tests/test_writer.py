@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from adopy.ado import AdoBlock, BlockType
+from adopy.writer import BlockFormat, write_region
+
+import numpy as np
+import pytest
+
+
+class TestBlockFormat(object):
+    @pytest.mark.parametrize('values', [
+        np.linspace(-1e3, 1e3, 20001),
+        np.arange(13),
+        np.array(['a', 'bcd', 'efgh']),
+        ])
+    def test_nbytes(self, values):
+        block = AdoBlock('values', BlockType.ARRAY, values)
+        blockformat = BlockFormat(ncols=4, width=16, precision=8)
+        assert len(blockformat.format(block)) == blockformat.nbytes(block)
+
+    def test_separator(self):
+        block = AdoBlock('count', BlockType.SCALAR, 12)
+        assert BlockFormat().format(block, separator=False) == (
+            b'*SET*COUNT\n1\n12\nENDSET\n')
+
+    def test_overflow(self):
+        block = AdoBlock('ids', BlockType.ARRAY, np.array([1, 10 ** 12]))
+        with pytest.raises(ValueError):
+            BlockFormat(width=8).format(block)
+
+    def test_write_region(self, tmpdir):
+        block = AdoBlock('values', BlockType.ARRAY, np.arange(10.))
+        blockformat = BlockFormat()
+        size = blockformat.nbytes(block)
+        path = tmpdir.join('region.ado')
+        path.write_binary(b'#' * (size + 2))
+        write_region(str(path), 1, size, block, blockformat)
+        data = path.read_binary()
+        assert data[1:-1] == blockformat.format(block)
+        assert data[:1] == data[-1:] == b'#'
+
+    def test_write_region_overflow(self, tmpdir):
+        block = AdoBlock('values', BlockType.ARRAY, np.arange(10.))
+        blockformat = BlockFormat()
+        size = blockformat.nbytes(block)
+        path = tmpdir.join('region.ado')
+        path.write_binary(b'#' * size)
+        with pytest.raises(ValueError):
+            write_region(str(path), 0, size - 1, block, blockformat)
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import adopy
+from adopy.flo import TransientAdoBlock
+from adopy.ado import BlockType
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def zones():
+    return np.array([3, 1, 1, 3, -1, 2, 3, 2])
+
+
+@pytest.fixture
+def weights():
+    return np.array([1., 2., 1., 1., 5., 1., 2., 3.])
+
+
+class TestZoneIndex(object):
+    def test_reduce(self, zones, weights):
+        index = adopy.ZoneIndex(zones, weights=weights, nodata=-1)
+        values = np.arange(8.)
+        assert np.array_equal(index.zones, [1, 2, 3])
+        assert np.allclose(index.reduce(values, 'sum'),
+            [2. * 1 + 1. * 2, 5. + 3. * 7, 0. + 3. + 2. * 6])
+        assert np.allclose(index.reduce(values, 'mean'),
+            [4. / 3., 26. / 4., 15. / 4.])
+        assert np.allclose(index.reduce(values, 'min'), [1., 5., 0.])
+        assert np.allclose(index.reduce(values, 'max'), [2., 7., 6.])
+
+    def test_reduce_stack(self, zones, weights):
+        index = adopy.ZoneIndex(zones, weights=weights)
+        stack = np.random.RandomState(4).rand(5, 8)
+        table = index.reduce(stack)
+        assert table.shape == (5, 4)
+        assert np.allclose(table[3], index.reduce(stack[3]))
+
+    def test_reduce_blocks(self, zones, weights):
+        index = adopy.ZoneIndex(zones, weights=weights, nodata=-1)
+        stack = np.random.RandomState(5).rand(3, 8)
+        blocks = (
+            TransientAdoBlock('PHI1', time, BlockType.ARRAY, values)
+            for time, values in zip([1., 2., 3.], stack)
+            )
+        times, table = index.reduce_blocks(blocks, statistic='max')['PHI1']
+        assert np.array_equal(times, [1., 2., 3.])
+        assert np.allclose(table, index.reduce(stack, statistic='max'))
+
+    def test_reduce_blocks_skip(self, zones, weights):
+        index = adopy.ZoneIndex(zones, weights=weights, nodata=-1)
+        stack = np.random.RandomState(6).rand(2, 8)
+        blocks = [
+            TransientAdoBlock('ITER', 1., BlockType.SCALAR, 12),
+            TransientAdoBlock('PHI1', 1., BlockType.ARRAY, stack[0]),
+            TransientAdoBlock('FLUX', 1., BlockType.ARRAY, np.arange(5.)),
+            TransientAdoBlock('PHI1', 2., BlockType.ARRAY, stack[1]),
+            ]
+        reduced = index.reduce_blocks(blocks)
+        assert list(reduced) == ['PHI1']
+        assert np.allclose(reduced['PHI1'][1], index.reduce(stack))
+        with pytest.raises(ValueError):
+            index.reduce_blocks(blocks, names=['FLUX'])